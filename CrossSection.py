@@ -2,72 +2,132 @@
 
 """ Data object to store cross section characteric values. """
 
-from re import search
+import numpy as np
 from Logger import LGR
 from PdgParticle import PdgParticle
 
 class CrossSection(PdgParticle):
 
-    """ Data object to store cross section characteristic values. """
+    """ Data object to store cross section characteristic values. The
+    production processes are stored in arrays, together with an index per
+    (id_particle_1, id_particle_2) and a mask of the strong processes. """
 
     def __init__(self):
 
         """ Initialize object variables. """
 
-        self._p1 = []
-        self._p2 = []
-        self._xs = []
+        self._p1 = np.zeros(0, dtype=int)
+        self._p2 = np.zeros(0, dtype=int)
+        self._xs = np.zeros(0)
 
-    def get_xs(self, com, path):
+        # LO cross sections as in the SLHA file, self._xs has the k-factors
+        # applied
+        self._xs_lo = np.zeros(0)
 
-        """ Get cross section from SLHA. """
+        # Mask of strong production processes
+        self._strong = np.zeros(0, dtype=bool)
 
-        # Regex to be searched in SLHA file
+        # Index of the production processes per (id_particle_1,
+        # id_particle_2)
+        self._d_index = {}
+
+        # k-factors for strong and weak production
+        self._k_strong = 1.
+        self._k_weak = 1.
+
+    def get_xs(self, com, slha):
+
+        """ Get cross section from SLHA (a SlhaReader object). """
+
+        # Center of mass energy in GeV, as written in the SLHA file
         if com == 13:
-            regex_xs = r'XSECTION *1\.30E\+04 *2212 2212 2'
+            sqrts = 1.30E+04
         elif com == 8:
-            regex_xs = r'XSECTION *8\.00E\+03 *2212 2212 2'
+            sqrts = 8.00E+03
         else:
             raise ValueError('Only cross-sections of 8 or 13 TeV are allowed.')
 
-        with open('{}/susyhit_slha.out'.format(path), 'r') as f_susyhit:
-            found_xsec = False
-            for line in f_susyhit:
-                if found_xsec:
-                    # Multiply by 1000. to get cross section in fb
-                    self._xs.append(1000.*float(line.split()[6]))
-                    found_xsec = False
-                # If the xs matches, set bool, next line will have the xs
-                if search(regex_xs, line):
-                    LGR.debug(line.rstrip())
-                    self._p1.append(int(line.split()[5]))
-                    self._p2.append(int(line.split()[6]))
-                    found_xsec = True
+        # Only consider pp -> 2 particles, the first line has the xs
+        l_p1 = self._p1.tolist()
+        l_p2 = self._p2.tolist()
+        l_xs_lo = self._xs_lo.tolist()
+        for sqrts_xs, initial, final, lines in slha.get_xsections():
+            if sqrts_xs != sqrts or initial != (2212, 2212) or \
+               len(final) != 2 or not lines:
+                continue
+            LGR.debug('XSECTION %s %s %s', sqrts_xs, initial, final)
+            l_p1.append(final[0])
+            l_p2.append(final[1])
+            # Multiply by 1000. to get cross section in fb
+            l_xs_lo.append(1000.*float(lines[0][6]))
+
+        self._p1 = np.array(l_p1, dtype=int)
+        self._p2 = np.array(l_p2, dtype=int)
+        self._xs_lo = np.array(l_xs_lo, dtype=float)
+        self._strong = (self._get_categories(self._p1) &
+                        self._get_categories(self._p2) &
+                        self._cat_strong) > 0
+
+        # Keep the first process, if there are several with the same IDs
+        self._d_index = {}
+        for idx, ids in enumerate(zip(l_p1, l_p2)):
+            self._d_index.setdefault(ids, idx)
+
+        self._apply_k_factors()
+
+    def set_k_factors(self, k_strong, k_weak):
+
+        """ Set k-factors for strong and weak production, which are applied
+        to the LO cross sections. """
+
+        self._k_strong = k_strong
+        self._k_weak = k_weak
+        self._apply_k_factors()
+
+    def _apply_k_factors(self):
+
+        """ Apply k-factors to the LO cross sections. """
+
+        self._xs = np.where(self._strong, self._k_strong,
+                            self._k_weak)*self._xs_lo
+
+    def get_weights(self):
+
+        """ Get array of the cross sections of all production processes,
+        normalized to the inclusive cross section. """
+
+        return self._xs/self.get_xs_incl()
+
+    def get_processes(self):
+
+        """ Get list of (id_particle_1, id_particle_2, weight) of all
+        production processes, where the weight is the cross section
+        normalized to the inclusive cross section. """
+
+        if not self._xs.size:
+            return []
+
+        return zip(self._p1.tolist(), self._p2.tolist(),
+                   self.get_weights().tolist())
 
     def get_xs_dominant(self):
 
         """ Get the dominant production process. """
 
-        idx = self._xs.index(max(self._xs))
-        return self._p1[idx], self._p2[idx]
+        idx = np.argmax(self._xs)
+        return int(self._p1[idx]), int(self._p2[idx])
 
     def get_xs_incl(self):
 
         """ Get inclusive cross section. """
 
-        return sum(self._xs)
+        return float(self._xs.sum())
 
     def get_xs_strong(self):
 
         """ Get strong cross section. """
 
-        xs_strong = 0.
-        for idx, xs in enumerate(self._xs):
-            if self._is_strong(self._p1[idx]) and \
-               self._is_strong(self._p2[idx]):
-                xs_strong += xs
-
-        return xs_strong
+        return float(self._xs[self._strong].sum())
 
     def get_xs_particle(self, id_particle_1, id_particle_2=-1.):
 
@@ -77,9 +137,8 @@ class CrossSection(PdgParticle):
         if id_particle_2 < 0:
             id_particle_2 = id_particle_1
 
-        for idx, xs in enumerate(self._xs):
-            if self._p1[idx] == id_particle_1 and \
-               self._p2[idx] == id_particle_2:
-                return xs
+        idx = self._d_index.get((id_particle_1, id_particle_2))
+        if idx is None:
+            return 0.
 
-        return 0.
+        return float(self._xs[idx])
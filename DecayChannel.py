@@ -2,14 +2,54 @@
 
 """ Data object to store decay channel characteristic values. """
 
-from ROOT import kGreen, kCyan, kBlue, kMagenta, kPink, kViolet
-from ROOT import kAzure, kTeal, kOrange, kRed, kYellow, kSpring, kGray
+import numpy as np
 from Logger import LGR
+from PdgParticle import PdgParticle
 
-class DecayChannel(object):
+class DecayChannel(PdgParticle):
 
     """ Data object to store decay channel characteristic values. """
 
+    # SUSY subcategories per particle ID
+    _d_cat_susy = dict(
+        [(1000021, 1), (1000022, 2), (1000023, 3), (1000024, 4),
+         (1000025, 5), (1000037, 9), (1000035, 10)] +
+        [(id_particle, 6) for id_particle in
+         [1000001, 1000002, 1000003, 1000004,
+          2000001, 2000002, 2000003, 2000004]] +
+        [(id_particle, 7) for id_particle in
+         [1000005, 1000006, 2000005, 2000006]] +
+        [(id_particle, 8) for id_particle in
+         [1000011, 1000012, 1000013, 1000014, 1000015, 1000016,
+          2000011, 2000012, 2000013, 2000014, 2000015, 2000016]])
+
+    # SM subcategories for one particle per particle ID
+    _d_cat_sm_single = dict(
+        [(21, 7), (22, 8), (23, 10), (24, 9), (25, 11), (6, 13)] +
+        [(id_particle, 12) for id_particle in [1, 2, 3, 4, 5]] +
+        [(id_particle, 14) for id_particle in [11, 12, 13, 14, 15, 16]])
+
+    # SM subcategories for two particles per pair of particle categories
+    # (see PdgParticle)
+    _cat_sm = PdgParticle._cat_quark | PdgParticle._cat_top | \
+              PdgParticle._cat_charged_lepton | PdgParticle._cat_neutrino
+    _d_cat_sm_pair = {
+        (PdgParticle._cat_quark, PdgParticle._cat_quark): 1,
+        (PdgParticle._cat_top, PdgParticle._cat_top): 2,
+        (PdgParticle._cat_quark, PdgParticle._cat_top): 3,
+        (PdgParticle._cat_top, PdgParticle._cat_quark): 3,
+        (PdgParticle._cat_charged_lepton,
+         PdgParticle._cat_charged_lepton): 4,
+        (PdgParticle._cat_charged_lepton, PdgParticle._cat_neutrino): 5,
+        (PdgParticle._cat_neutrino, PdgParticle._cat_charged_lepton): 5,
+        (PdgParticle._cat_neutrino, PdgParticle._cat_neutrino): 6}
+
+    # Decay channel as stored per point, see self.get_array()
+    dtype = np.dtype([('susy', np.int8), ('sm', np.int8), ('br', float)])
+
+    # Number of decay channels per particle which are stored
+    no_channels_max = 64
+
     def __init__(self):
 
         """ Initialize object variables. """
@@ -25,6 +65,38 @@ class DecayChannel(object):
         self._classify_particles(decay[1])
         self._br.append(decay[0])
 
+    def get_array(self):
+
+        """ Get array of all decay channels with a branching ratio above 0,
+        one entry of (SUSY subcategory, SM subcategory, branching ratio) per
+        decay mode (see self.dtype), padded with zeros to
+        self.no_channels_max entries. If there are more decay modes, the
+        ones with the smallest branching ratios are dropped. """
+
+        brs = np.array(self._br, dtype=float)
+        idxs = np.flatnonzero(brs > 0.)
+        if idxs.size > self.no_channels_max:
+            LGR.warning('Only %d of %d decay channels are stored.',
+                        self.no_channels_max, idxs.size)
+            idxs = np.sort(idxs[np.argsort(-brs[idxs], kind='mergesort')
+                                [:self.no_channels_max]])
+
+        channels = np.zeros(self.no_channels_max, dtype=self.dtype)
+        channels['susy'][:idxs.size] = np.array(self._susy, dtype=int)[idxs]
+        channels['sm'][:idxs.size] = np.array(self._sm, dtype=int)[idxs]
+        channels['br'][:idxs.size] = brs[idxs]
+        return channels
+
+    def fill_array(self, channels):
+
+        """ Fill object variables from array of decay channels channels (see
+        self.get_array()). """
+
+        channels = channels[channels['br'] > 0.]
+        self._susy.extend(channels['susy'].tolist())
+        self._sm.extend(channels['sm'].tolist())
+        self._br.extend(channels['br'].tolist())
+
     def _classify_particles(self, id_particles):
 
         """ Classifies the list id_particles into a category. A category is a
@@ -45,33 +117,12 @@ class DecayChannel(object):
         """ Classify integer id_particle into SUSY subcategory (see
         self._classify_particles()) for details. """
 
-        if id_particle == 1000021:
-            return 1
-        elif id_particle == 1000022:
-            return 2
-        elif id_particle == 1000023:
-            return 3
-        elif id_particle == 1000024:
-            return 4
-        elif id_particle == 1000025:
-            return 5
-        elif id_particle in [1000001, 1000002, 1000003, 1000004,
-                             2000001, 2000002, 2000003, 2000004]:
-            return 6
-        elif id_particle in [1000005, 1000006, 2000005, 2000006]:
-            return 7
-        elif id_particle in [1000011, 1000012, 1000013, 1000014,
-                             1000015, 1000016, 2000011, 2000012,
-                             2000013, 2000014, 2000015, 2000016]:
-            return 8
-        elif id_particle == 1000037:
-            return 9
-        elif id_particle == 1000035:
-            return 10
-        else:
+        cat_susy = self._d_cat_susy.get(id_particle, 0)
+        if cat_susy == 0:
             LGR.warning('Decay channel category for SUSY particle %s not '
                         'found.', id_particle)
-            return 0
+
+        return cat_susy
 
     def _classify_particles_sm(self, id_particles):
 
@@ -81,59 +132,10 @@ class DecayChannel(object):
         # 0 means undefined
         cat_sm = 0
         if len(id_particles) == 1:
-            if id_particles[0] == 21:
-                # g
-                cat_sm = 7
-            elif id_particles[0] == 22:
-                # y
-                cat_sm = 8
-            elif id_particles[0] == 23:
-                # Z
-                cat_sm = 10
-            elif id_particles[0] == 24:
-                # W
-                cat_sm = 9
-            elif id_particles[0] == 25:
-                # h
-                cat_sm = 11
-            elif id_particles[0] in [1, 2, 3, 4, 5]:
-                # q
-                cat_sm = 12
-            elif id_particles[0] == 6:
-                # t
-                cat_sm = 13
-            elif id_particles[0] in [11, 12, 13, 14, 15, 16]:
-                # l
-                cat_sm = 14
+            cat_sm = self._d_cat_sm_single.get(id_particles[0], 0)
         elif len(id_particles) == 2:
-            if id_particles[0] in [1, 2, 3, 4, 5]:
-                if id_particles[1] in [1, 2, 3, 4, 5]:
-                    # qq
-                    cat_sm = 1
-                elif id_particles[1] in [6]:
-                    # qt
-                    cat_sm = 3
-            elif id_particles[0] in [6]:
-                if id_particles[1] in [1, 2, 3, 4, 5]:
-                    # qt
-                    cat_sm = 3
-                elif id_particles[1] in [6]:
-                    # tt
-                    cat_sm = 2
-            elif id_particles[0] in [11, 13, 15]:
-                if id_particles[1] in [11, 13, 15]:
-                    # ll
-                    cat_sm = 4
-                elif id_particles[1] in [12, 14, 16]:
-                    # nu l
-                    cat_sm = 5
-            elif id_particles[0] in [12, 14, 16]:
-                if id_particles[1] in [11, 13, 15]:
-                    # nu l
-                    cat_sm = 5
-                elif id_particles[1] in [12, 14, 16]:
-                    # nu nu
-                    cat_sm = 6
+            cat_sm = self._d_cat_sm_pair.get(
+                tuple(self._get_categories(id_particles) & self._cat_sm), 0)
 
         if cat_sm == 0:
             LGR.warning('Decay channel category for SM particle(s) %s not '
@@ -240,7 +242,12 @@ class DecayChannel(object):
 
     def get_color(self, ps_susy, ps_sm):
 
-        """ Return color for category combination. """
+        """ Return color for category combination. ROOT is only loaded
+        here, so that the classification works without it. """
+
+        # pylint: disable=import-error
+        from ROOT import kGreen, kCyan, kBlue, kMagenta, kPink, kViolet
+        from ROOT import kAzure, kTeal, kOrange, kRed, kYellow, kSpring, kGray
 
         if ps_susy == 1:
             if ps_sm in [1, 12]:
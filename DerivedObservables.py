@@ -0,0 +1,104 @@
+#!/usr/bin/env python2
+
+""" Observables derived from the columns of the results of a scan. """
+
+import numpy as np
+
+
+class DerivedObservables(object):
+
+    """ Observables derived from the columns of the results of a scan. Each
+    observable is declared as an operation on other observables or columns
+    (see self.add()) and evaluated on all points at once with NumPy. The
+    results are only evaluated when they are requested and are cached until
+    self.clear() is called, e.g. when points are added. """
+
+    # Operations, each is applied to the arrays of the operands by the
+    # method of the same name with a leading underscore
+    l_operations = ['difference', 'ratio', 'product', 'inclusive']
+
+    def __init__(self, store):
+
+        """ Initialize object variables, store is the ResultStore with the
+        columns. """
+
+        self._store = store
+
+        # Declarations of the observables, {name: (operation, operands)}
+        self._d_declarations = {}
+
+        # Evaluated observables, {name: array}
+        self._d_cache = {}
+
+    def add(self, name, operation, *operands):
+
+        """ Declare observable name as operation (see self.l_operations) on
+        operands, which are names of columns or other observables, e.g.
+            add('m_gluino-m_chargino1', 'difference', 'm_gluino',
+                'm_chargino1') """
+
+        if operation not in self.l_operations:
+            raise ValueError('Unknown operation {}.'.format(operation))
+
+        self._d_declarations[name] = (operation, operands)
+        self._d_cache.pop(name, None)
+
+    def get(self, name):
+
+        """ Get array of observable name (or column name, if there is no
+        such observable) for all points, with the points as last axis. """
+
+        if name not in self._d_declarations:
+            return np.moveaxis(self._store.get_column(name), 0, -1)
+
+        if name not in self._d_cache:
+            operation, operands = self._d_declarations[name]
+            arrays = [np.asarray(self.get(operand), dtype=float)
+                      for operand in operands]
+            # Columns which have not been filled have no points, in which
+            # case the observable has no points either
+            if any(array.shape[-1] == 0 for array in arrays):
+                self._d_cache[name] = np.zeros(arrays[0].shape[:-1] + (0,))
+            else:
+                self._d_cache[name] = getattr(
+                    self, '_{}'.format(operation))(*arrays)
+        return self._d_cache[name]
+
+    def clear(self):
+
+        """ Drop all evaluated observables. """
+
+        self._d_cache.clear()
+
+    @staticmethod
+    def _difference(minuend, subtrahend):
+
+        """ Difference of two arrays. """
+
+        return minuend - subtrahend
+
+    @staticmethod
+    def _ratio(numerator, denominator):
+
+        """ Ratio of two arrays, 0 where the denominator is 0. """
+
+        numerator, denominator = np.broadcast_arrays(numerator, denominator)
+        return np.divide(numerator, denominator,
+                         out=np.zeros(numerator.shape),
+                         where=denominator != 0)
+
+    @staticmethod
+    def _product(factor1, factor2):
+
+        """ Product of two arrays. """
+
+        return factor1 * factor2
+
+    @staticmethod
+    def _inclusive(brs):
+
+        """ Inclusive branching ratios from an array of branching ratios per
+        multiplicity (first axis), i.e. entry n is the sum of entries n and
+        above. """
+
+        return np.cumsum(brs[::-1], axis=0)[::-1]
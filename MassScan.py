@@ -3,19 +3,32 @@
 """ Make a mass scan for different SUSY particle masses with SUSYHIT and
     calculates branching ratios to various final states. """
 
-from os import system
-from re import sub, subn, search
-from itertools import dropwhile, takewhile, ifilterfalse, tee, product
-from functools import reduce
+from os import system, getcwd, getpid, walk, makedirs, link, access, X_OK
+from os import rename, remove, listdir
+from os.path import join, normpath, relpath
+from shutil import copy2, copyfile, rmtree
+from tempfile import mkdtemp
+from multiprocessing import Pool
+from multiprocessing.util import Finalize
+from multiprocessing.pool import ThreadPool
+from Queue import Queue
+from cPickle import dump, load, HIGHEST_PROTOCOL, UnpicklingError
+from re import search, match
+from itertools import product
 from cmath import isnan
-from fileinput import input
 from collections import defaultdict
+import numpy as np
 from Logger import LGR
-from ToolboxHelper import get_lst_entry_default
 from PdgParticle import PdgParticle
 from MassScanPlots import MassScanPlots
 from DecayChannel import DecayChannel
 from CrossSection import CrossSection
+from SusyhitCache import SusyhitCache
+from MultiplicityCache import MultiplicityCache
+from SlhaReader import SlhaReader
+from SlhaTemplate import SlhaTemplate
+from SModelSService import SModelSService
+from Pipeline import Pipeline
 
 
 class MassScan(PdgParticle):
@@ -31,9 +44,15 @@ class MassScan(PdgParticle):
     _calc_br = True
     _calc_mu = False
 
-    # Directory where SUSYHIT is installed
+    # Calculate signal strength with a long-lived SModelS process, which loads
+    # the database only once, instead of running runSModelS for every point
+    _use_smodels_service = True
+
+    # Directory where SUSYHIT is installed; the version is also part of the
+    # key of the SUSYHIT output cache
+    _susyhit_version = 'susyhit-1.5-suspect-2.4.3'
     _dir_susyhit = '/uscms/home/bschneid/nobackup/pkg/install/'
-    _dir_susyhit += 'susyhit-1.5-suspect-2.4.3'
+    _dir_susyhit += _susyhit_version
     # Define SUSYHIT option, this should be the same as in susyhit.in:
     # 1 for SuSpect-HDECAY-SDECAY
     # 2 for SDECAY-HDECAY
@@ -45,6 +64,25 @@ class MassScan(PdgParticle):
     _k_strong = 1.99
     _k_weak = 1.30
 
+    # Maximum number of decay steps in the Monte Carlo calculation of the
+    # branching ratios, see set_br_engine()
+    _mc_depth_max = 100
+
+    # Variables which describe a point and are filled into MassScanPlots
+    _l_point_vars = ['_m_gluino', '_m_neutralino1', '_m_neutralino2',
+                     '_m_neutralino3', '_m_neutralino4', '_m_chargino1',
+                     '_m_chargino2', '_m_stop1', '_m_stop2', '_m_smhiggs',
+                     '_m_sdown_l', '_m_sdown_r', '_m_sup_l', '_m_sup_r',
+                     '_m_sstrange_l', '_m_sstrange_r', '_m_scharm_l',
+                     '_m_scharm_r', '_ct_gluino', '_ct_chargino1',
+                     '_ct_neutralino2', '_xs13_incl', '_xs13_strong',
+                     '_xs13_gluinos', '_xs8_incl', '_xs8_strong', '_dom_id1',
+                     '_dom_id2', '_dc', '_br_leptons', '_br_jets',
+                     '_br_photons', '_br_met', '_br_joint', '_br_error',
+                     '_br_leptons_err',
+                     '_br_jets_err', '_br_photons_err', '_br_met_err',
+                     '_br_thresholds', '_mu']
+
     def __init__(self):
 
         """ Initialization of class and instance variables. """
@@ -64,6 +102,25 @@ class MassScan(PdgParticle):
         # Branching ratios below this threshold are skipped (to save time)
         self._threshold = 0.05
 
+        # Maximum probability per point which may be discarded by skipping
+        # branching ratios and production processes (None: only use
+        # self._threshold), see self.set_precision()
+        self._precision = None
+
+        # Probability which may still be discarded in the decays of the
+        # current point, see self._get_multiplicities_budget()
+        self._budget = 0.
+
+        # Additional thresholds for which the branching ratios are calculated
+        # as well, see self.set_thresholds()
+        self._l_thresholds = []
+
+        # Calculation of the branching ratios ('exact' or 'mc'), number of
+        # decay chains and random seed for 'mc', see self.set_br_engine()
+        self._br_engine = 'exact'
+        self._mc_samples = 10000
+        self._mc_seed = None
+
         # Masses of particles
         self._m_gluino = -1.
         self._m_neutralino1 = -1.
@@ -104,34 +161,37 @@ class MassScan(PdgParticle):
         self._xs13 = CrossSection()
         self._xs8 = CrossSection()
 
-        # Decay channels
-        self._dc_gluino = DecayChannel()
-        self._dc_chargino1 = DecayChannel()
-        self._dc_chargino2 = DecayChannel()
-        self._dc_neutralino2 = DecayChannel()
-        self._dc_neutralino3 = DecayChannel()
-        self._dc_neutralino4 = DecayChannel()
-        self._dc_sdown_l = DecayChannel()
-        self._dc_sdown_r = DecayChannel()
-        self._dc_sup_l = DecayChannel()
-        self._dc_sup_r = DecayChannel()
-        self._dc_sstrange_l = DecayChannel()
-        self._dc_sstrange_r = DecayChannel()
-        self._dc_scharm_l = DecayChannel()
-        self._dc_scharm_r = DecayChannel()
+        # Decay channels per particle (see MassScanPlots.l_dc_names and
+        # DecayChannel.get_array())
+        self._dc = self._get_dcs_empty()
 
         # Branching ratios into particles
         self._br_leptons = []
         self._br_jets = []
         self._br_photons = []
+        self._br_met = []
+
+        # Joint distribution of the number of leptons, jets, photons and
+        # invisible particles, see self._get_multiplicities()
+        self._br_joint = np.zeros((0, 0, 0, 0))
+
+        # Upper bound on the probability discarded in the branching ratios
+        self._br_error = 0.
+
+        # Branching ratios into leptons, jets, photons and invisible
+        # particles for the additional thresholds
+        self._br_thresholds = []
+
+        # Statistical uncertainties of the branching ratios, only for the
+        # Monte Carlo calculation
+        self._br_leptons_err = []
+        self._br_jets_err = []
+        self._br_photons_err = []
+        self._br_met_err = []
 
         # Signal strength
         self._mu = 0.
 
-        # Track errors, we still want to fill all lists, otherwise the
-        # binning will be screwed up
-        self._error = False
-
         # Dictionary for decay modes;
         # The SM decays are filled by hand
         # The SUSY decays are filled on the fly when needed,
@@ -139,6 +199,54 @@ class MassScan(PdgParticle):
         self._d_sm = {}
         self._d_susy = {}
 
+        # Dictionary for the multiplicity distributions of particles, see
+        # self._get_multiplicities()
+        self._d_mult = {}
+
+        # Dictionary for the multiplicity distributions of particles and the
+        # upper bound on the probability discarded in them, if a precision
+        # is set, see self._get_multiplicities_budget()
+        self._d_mult_budget = {}
+
+        # Dictionary for the hashes of the decay subtrees of particles and
+        # cache of the multiplicity distributions per hash, which is kept
+        # for all points
+        self._d_hash = {}
+        self._mult_cache = MultiplicityCache()
+
+        # Dictionary for the branching ratios into particles for one leg, see
+        # self._get_br_1leg()
+        self._d_br_1leg = {}
+
+        # Dictionaries for the decay tables of the Monte Carlo calculation
+        # and for the particles which only decay into unknown particles, see
+        # self._get_mc_table() and self._is_unknown_leg()
+        self._d_mc_table = {}
+        self._d_mc_unknown = {}
+
+        # Content of the SUSYHIT output file of the current point
+        self._slha = None
+
+        # Template of the SUSYHIT input file, read when the scan starts
+        self._slha_template = None
+
+        # Directory in which finished points are stored (None: disabled)
+        self._dir_checkpoint = None
+
+        # Cache of SUSYHIT output files (None: disabled)
+        self._susyhit_cache = None
+
+        # Parameter file of SModelS (None: default of runSModelS), used both
+        # by the SModelS service and runSModelS
+        self._smodels_parameters = None
+
+        # SModelS service, the process is started when it is first needed
+        self._smodels_service = SModelSService()
+
+        # Maximum number of points processed at the same time per stage in
+        # the pipelined scan, see self._scan_pipelined()
+        self._d_stage_concurrency = {'susyhit': 1, 'xsec': 1, 'smodels': 1}
+
     def set_parameter(self, prmtr_id_x, prmtr_id_y):
 
         """ Set variable parameters x and y. """
@@ -185,36 +293,41 @@ class MassScan(PdgParticle):
         else:
             raise ValueError('susyhit_option is neither 1 nor 2.')
 
-    def _set_parameter_all(self, prmtr_x, prmtr_y):
+    def _set_parameter_all(self, prmtr_x, prmtr_y, dir_susyhit):
+
+        """ Set all parameters in the SLHA file in directory dir_susyhit. The
+        file is rendered from the template and written at once, its text is
+        returned. """
 
-        """ Set all parameters in the SLHA file. """
+        # Values per (BLOCK name, key) which are set in the template
+        d_values = {}
 
         # Set main parameter in x
         # Some combinations are concatenated for axis labeling
         if self._prmtr_id_x == 4142:
             for newprmtr in range(41, 43):
-                self._set_parameter_slha(newprmtr, prmtr_x)
+                self._set_parameter_slha(newprmtr, prmtr_x, d_values)
         elif self._prmtr_id_x == 44454748:
             for newprmtr in [44, 45, 47, 48]:
-                self._set_parameter_slha(newprmtr, prmtr_x)
+                self._set_parameter_slha(newprmtr, prmtr_x, d_values)
         elif self._prmtr_id_x == 313233343536:
             for newprmtr in range(31, 37):
-                self._set_parameter_slha(newprmtr, prmtr_x)
+                self._set_parameter_slha(newprmtr, prmtr_x, d_values)
         else:
-            self._set_parameter_slha(self._prmtr_id_x, prmtr_x)
+            self._set_parameter_slha(self._prmtr_id_x, prmtr_x, d_values)
 
         # Set main parameter in y
         if self._prmtr_id_y == 4142:
             for newprmtr in range(41, 43):
-                self._set_parameter_slha(newprmtr, prmtr_y)
+                self._set_parameter_slha(newprmtr, prmtr_y, d_values)
         elif self._prmtr_id_y == 44454748:
             for newprmtr in [44, 45, 47, 48]:
-                self._set_parameter_slha(newprmtr, prmtr_y)
+                self._set_parameter_slha(newprmtr, prmtr_y, d_values)
         elif self._prmtr_id_y == 313233343536:
             for newprmtr in range(31, 37):
-                self._set_parameter_slha(newprmtr, prmtr_y)
+                self._set_parameter_slha(newprmtr, prmtr_y, d_values)
         else:
-            self._set_parameter_slha(self._prmtr_id_y, prmtr_y)
+            self._set_parameter_slha(self._prmtr_id_y, prmtr_y, d_values)
 
         # Set additional parameters in x (with possibly scale and offset)
         for key in set(self._d_prmtr_x_add.keys() +
@@ -223,21 +336,24 @@ class MassScan(PdgParticle):
                 for newkey in range(41, 43):
                     scale = self._d_prmtr_x_scale[key]
                     value = self._d_prmtr_x_add[key]
-                    self._set_parameter_slha(newkey, scale*prmtr_x+value)
+                    self._set_parameter_slha(newkey, scale*prmtr_x+value,
+                                             d_values)
             elif key == 44454748:
                 for newkey in [44, 45, 47, 48]:
                     scale = self._d_prmtr_x_scale[key]
                     value = self._d_prmtr_x_add[key]
-                    self._set_parameter_slha(newkey, scale*prmtr_x+value)
+                    self._set_parameter_slha(newkey, scale*prmtr_x+value,
+                                             d_values)
             elif key == 313233343536:
                 for newkey in range(31, 37):
                     scale = self._d_prmtr_x_scale[key]
                     value = self._d_prmtr_x_add[key]
-                    self._set_parameter_slha(newkey, scale*prmtr_x+value)
+                    self._set_parameter_slha(newkey, scale*prmtr_x+value,
+                                             d_values)
             else:
                 scale = self._d_prmtr_x_scale[key]
                 value = self._d_prmtr_x_add[key]
-                self._set_parameter_slha(key, scale*prmtr_x+value)
+                self._set_parameter_slha(key, scale*prmtr_x+value, d_values)
 
         # Set additional parameters in y (with possibly scale and offset)
         for key in set(self._d_prmtr_y_add.keys() +
@@ -246,71 +362,46 @@ class MassScan(PdgParticle):
                 for newkey in range(41, 43):
                     scale = self._d_prmtr_y_scale[key]
                     value = self._d_prmtr_y_add[key]
-                    self._set_parameter_slha(newkey, scale*prmtr_y+value)
+                    self._set_parameter_slha(newkey, scale*prmtr_y+value,
+                                             d_values)
             elif key == 44454748:
                 for newkey in [44, 45, 47, 48]:
                     scale = self._d_prmtr_y_scale[key]
                     value = self._d_prmtr_y_add[key]
                     LGR.warning(self._d_prmtr_y_add)
-                    self._set_parameter_slha(newkey, scale*prmtr_y+value)
+                    self._set_parameter_slha(newkey, scale*prmtr_y+value,
+                                             d_values)
             elif key == 313233343536:
                 for newkey in range(31, 37):
                     scale = self._d_prmtr_y_scale[key]
                     value = self._d_prmtr_y_add[key]
-                    self._set_parameter_slha(newkey, scale*prmtr_y+value)
+                    self._set_parameter_slha(newkey, scale*prmtr_y+value,
+                                             d_values)
             else:
                 scale = self._d_prmtr_y_scale[key]
                 value = self._d_prmtr_y_add[key]
-                self._set_parameter_slha(key, scale*prmtr_y+value)
+                self._set_parameter_slha(key, scale*prmtr_y+value, d_values)
 
-    def _set_parameter_slha(self, idx, parameter):
+        return self._slha_template.write(
+            '{}/{}.in'.format(dir_susyhit, self._get_susyhit_filename()),
+            d_values)
 
-        """ Set parameter in SUSYHIT input file. """
+    def _set_parameter_slha(self, idx,  # pylint: disable=no-self-use
+                            parameter, d_values):
+
+        """ Set parameter idx in block EXTPAR of the SUSYHIT input file, the
+        value is stored in d_values until the file is written. """
 
         LGR.debug('Set index %s to %s in SLHA.', idx, parameter)
-        # Set regular expressions in SLHA file
-        slha_in = '^ {} '.format(idx)
-        slha_out = ' {} '.format(idx)
-
-        # Read file
-        with open('{}/{}.in'.format(self._dir_susyhit,
-                                    self._get_susyhit_filename()), 'r') as f_in:
-            lines = f_in.readlines()
-
-        # Make changes and overwrite file
-        with open('{}/{}.in'.format(self._dir_susyhit,
-                                    self._get_susyhit_filename()), 'w') as f_in:
-            has_replacement = False
-            for line in lines:
-                t_new = subn('{}.*'.format(slha_in),
-                             '{}{}'.format(slha_out, parameter), line)
-                if t_new[1] > 0:
-                    LGR.debug('Replaced "%s" with "%s" in input file.',
-                              line.rstrip(), t_new[0].rstrip())
-                    has_replacement = True
-                f_in.write(t_new[0])
-            if not has_replacement:
-                raise RuntimeError('No replacement in SUSYHIT input file has '
-                                   'been done.')
-
-    def _set_masses(self, id_particle, m_particle):
-
-        """ Set masses in SUSYHIT input file. """
-
-        # Set regular expressions in SLHA file
-        slha = '   {}    '.format(id_particle)
-
-        # Read file
-        with open('{}/{}.in'.format(self._dir_susyhit,
-                                    self._get_susyhit_filename()), 'r') as f_in:
-            lines = f_in.readlines()
-
-        # Make changes and overwrite file
-        with open('{}/{}.in'.format(self._dir_susyhit,
-                                    self._get_susyhit_filename()), 'w') as f_in:
-            for line in lines:
-                f_in.write(sub('{}.*'.format(slha),
-                               '{}{}'.format(slha, m_particle), line))
+        d_values[('EXTPAR', idx)] = parameter
+
+    def _set_masses(self, id_particle,  # pylint: disable=no-self-use
+                    m_particle, d_values):
+
+        """ Set masses in SUSYHIT input file, the value is stored in d_values
+        until the file is written. """
+
+        d_values[('MASS', id_particle)] = m_particle
 
     def _run_external(self, name, cmd,  # pylint: disable=no-self-use
                       check_for_error=True):
@@ -325,13 +416,58 @@ class MassScan(PdgParticle):
         if system(cmd) and check_for_error:
             raise RuntimeError('Could not run {}.'.format(name))
 
-    def _check_susyhit_output(self):
+    def _run_susyhit(self, dir_susyhit, text_in):
+
+        """ Run SUSYHIT in directory dir_susyhit, unless it has been run with
+        the same input file (with text text_in) before and its output can be
+        taken from the cache. """
+
+        if self._susyhit_cache is None:
+            self._run_external('SUSYHIT', 'cd {} && ./run'.format(dir_susyhit))
+            return
+
+        key = self._susyhit_cache.get_key(text_in, self._susyhit_version,
+                                          self._susyhit_option)
+
+        if self._susyhit_cache.get(key, dir_susyhit):
+            return
+
+        self._run_external('SUSYHIT', 'cd {} && ./run'.format(dir_susyhit))
+        self._susyhit_cache.put(key, dir_susyhit)
+
+    def set_susyhit_cache(self, dir_cache, max_size=2**30):
+
+        """ Set directory in which SUSYHIT output files are cached, keyed by
+        the SUSYHIT input file. The cache can be shared between scans. If it
+        grows larger than max_size (in bytes), the least recently used
+        entries are removed. """
+
+        self._susyhit_cache = SusyhitCache(dir_cache, max_size)
+
+    def set_mult_cache(self, filename, max_entries=100000):
+
+        """ Set file in which the multiplicity distributions of decay subtrees
+        are kept between scans, see self._get_multiplicities(). The file is
+        written at the end of every scan. With worker processes (jobs > 1),
+        the distributions calculated by the workers are not saved. """
+
+        self._mult_cache = MultiplicityCache(filename, max_entries)
+
+    def _read_slha(self, filename):
 
-        """ Check SUSYHIT output file for errors. """
+        """ Read SUSYHIT output file filename, all information about masses,
+        decays and cross sections is taken from this object. """
+
+        if self._slha is not None:
+            self._slha.close()
+        self._slha = SlhaReader(filename)
+
+    def _check_susyhit_output(self, filename):  # pylint: disable=no-self-use
+
+        """ Check SUSYHIT output file filename (suspect2.out) for errors. """
 
         line_warning = 2
-        with open('{}/suspect2.out'
-                  .format(self._dir_susyhit), 'r') as f_suspect2:
+        with open(filename, 'r') as f_suspect2:
             for line in f_suspect2:
                 if line_warning == 0:
                     errorline = line.split('.')
@@ -383,126 +519,81 @@ class MassScan(PdgParticle):
                                 ...
                             ] """
 
-        # Open SUSYHIT output file
-        with open('{}/susyhit_slha.out'
-                  .format(self._dir_susyhit)) as f_susyhit_out:
-            # Select range to be read from file
-            f_susyhit_out_start = dropwhile(lambda l: not
-                                            search('^DECAY *{}'.format
-                                                   (abs(id_particle)), l),
-                                            f_susyhit_out)
-            f_susyhit_out_range = takewhile(lambda l: not search('^# *PDG', l)
-                                            and not search('^XSECTION', l),
-                                            f_susyhit_out_start)
-
-            # LGR.debug('Range selected from SUSYHIT output file for particle '
-            #           '%s:', id_particle)
-
-            # List of all decays
-            list_decays = []
-            # Loop over selected range and filter out comments
-            for line in ifilterfalse(lambda l: search('^ *#|^DECAY', l),
-                                     f_susyhit_out_range):
-                # LGR.debug(line.rstrip())
-
-                # Split line into list, format is
-                # [prob., # of childs, child1, child2, ..., comments]
-                list_line_str_comments = line.rstrip().split()
-                # LGR.debug('list: %s', list_line_str_comments)
-
-                # Skip empty lines
-                if len(list_line_str_comments) == 0:
-                    continue
+        # List of all decays
+        list_decays = []
+        for list_line in self._slha.get_decays(abs(id_particle)):
 
-                # Strip all comments from list_line_comments
-                list_line_str = list(takewhile(lambda m:
-                                               not str(m).startswith('#'),
-                                               list_line_str_comments))
-                # LGR.debug('list stripped from comments: %s', list_line_str)
-                del list_line_str_comments
-
-                # list_line_str needs to have length of at least 4, otherwise
-                # something's wrong with the input
-                if len(list_line_str) < 3:
-                    raise IndexError('list_line_str {} needs to have at least '
-                                     '4 elements. Something seems to be wrong '
-                                     'with the input.'.format(list_line_str))
-
-                # Convert first element (branching ratio) to float
-                # and other elements (number of daughter particles and particle
-                # ID's) to integers
-                list_line = []
-                list_line.append(float(list_line_str[0]))
-                list_line.append([int(x) for x in list_line_str[1:]])
-                # LGR.debug('list as numbers: %s', list_line)
-                del list_line_str
-
-                # According to SLHA format, second number per line should be
-                # number of daughter particles
-                if list_line[1][0]+1 != len(list_line[1]):
-                    raise IndexError('According to SLHA format, second number '
-                                     'per line should be number of daugher '
-                                     'particles. Something seems to be wrong '
-                                     'with the input.')
-
-                # Once we checked for consistency, we can remove list_line[1],
-                # since it is redundant
-                del list_line[1][0]
-
-                if isnan(list_line[0]):
-                    LGR.warning('Some decays have a branching ratio of "NaN" '
-                                'in the SUSYHIT output file. These decays are '
-                                'skipped.')
-                    continue
+            if isnan(list_line[0]):
+                LGR.warning('Some decays have a branching ratio of "NaN" '
+                            'in the SUSYHIT output file. These decays are '
+                            'skipped.')
+                continue
 
-                # Fill list of decays
-                list_decays.append(list_line)
-                del list_line
-
-            # Check if list of decays is empty
-            if not list_decays:
-                # If it is a SM particle, it probably needs to be filled by
-                # hand, if it is a SUSY particle, it will be ignored
-                #if abs(id_particle) < 1000000:
-                #    raise IndexError('SM particle {} could not be found in '
-                #                     'dictionary. Maybe it needs to be filled'
-                #                     ' by hand?'.format(id_particle))
-
-                # If the particle has no known decay modes, according to
-                # SUSYHIT, then we define its decay to 100 % into the unknown
-                # (and ignored) particle 999 (which is a final state)
-                list_decays.append([1., [999]])
-                LGR.warning('Added particle %s to list of ignored particles. '
-                            'It does not seem to have any decay modes in the '
-                            'SUSYHIT output file.', id_particle)
-
-            # Loop over list_decays to print debug information and sum up
-            # branching ratios
-            sum_br = 0
-            for list_decay in list_decays:
-                sum_br += list_decay[0]
-                LGR.debug('list_decay: %s', list_decay)
-
-            # Fill dictionary
-            self._d_susy[abs(id_particle)] = list_decays
-            LGR.info('Filled decay modes from particle with ID %s into '
-                     'dictionary.', id_particle)
-
-    def _partition(self, pred, iterable):  # pylint: disable=no-self-use
-
-        """ Use a predicate to partition entries into false entries and true
-        entries:
-        partition(is_odd, range(10)) --> 0 2 4 6 8   and  1 3 5 7 9
-        (Direct from the recipes in itertools documentation) """
-
-        tee1, tee2 = tee(iterable)
-        return ([item for item in tee1 if not pred(item)],
-                [item for item in tee2 if pred(item)])
-
-    def _prob_tree(self, id_particle, visited=frozenset()):
-
-        """ Generator of all end points of the probability tree contained
-        in d_susy, starting with id_particle """
+            # Fill list of decays
+            list_decays.append(list_line)
+
+        # Check if list of decays is empty
+        if not list_decays:
+            # If it is a SM particle, it probably needs to be filled by
+            # hand, if it is a SUSY particle, it will be ignored
+            #if abs(id_particle) < 1000000:
+            #    raise IndexError('SM particle {} could not be found in '
+            #                     'dictionary. Maybe it needs to be filled'
+            #                     ' by hand?'.format(id_particle))
+
+            # If the particle has no known decay modes, according to
+            # SUSYHIT, then we define its decay to 100 % into the unknown
+            # (and ignored) particle 999 (which is a final state)
+            list_decays.append([1., [999]])
+            LGR.warning('Added particle %s to list of ignored particles. '
+                        'It does not seem to have any decay modes in the '
+                        'SUSYHIT output file.', id_particle)
+
+        # Loop over list_decays to print debug information and sum up
+        # branching ratios
+        sum_br = 0
+        for list_decay in list_decays:
+            sum_br += list_decay[0]
+            LGR.debug('list_decay: %s', list_decay)
+
+        # Fill dictionary
+        self._d_susy[abs(id_particle)] = list_decays
+        LGR.info('Filled decay modes from particle with ID %s into '
+                 'dictionary.', id_particle)
+
+    def _get_thresholds(self):
+
+        """ Get all thresholds for which the branching ratios of the current
+        point are calculated with self._get_multiplicities(): the threshold
+        (see self.set_threshold()) first, then the additional thresholds (see
+        self.set_thresholds()). If a precision is set, the threshold is not
+        used (see self._get_multiplicities_budget()). """
+
+        if self._precision is not None:
+            return list(self._l_thresholds)
+        return [self._threshold] + self._l_thresholds
+
+    def _get_multiplicities(self, id_particle, visited=frozenset()):
+
+        """ Get the joint distributions of the number of leptons, jets,
+        photons and invisible particles in the decay of id_particle, one per
+        threshold (see self._get_thresholds()). A distribution is a dense 4-D
+        NumPy array, entry [n_leptons, n_jets, n_photons, n_met] is the
+        probability of these multiplicities; an empty distribution has size
+        0. The distributions of the children of every decay mode are
+        convolved,
+        so every particle is only processed once per point; the results are
+        memoized in self._d_mult and, by the content of the decay subtree
+        (see self._get_subtree_hash()), in self._mult_cache, so they are
+        shared between points. The cache is checked before the children are
+        processed, so the whole subtree is skipped if it is found. Decay
+        modes below a threshold are skipped for this threshold, decay modes
+        with unknown particles lead to empty distributions and are thus
+        dropped. If a threshold makes no difference for a particle, the
+        distribution is shared with the previous threshold (the same object),
+        so it is only calculated once. """
+
+        id_particle = abs(id_particle)
 
         # Check if the node has already been visited (which would lead to
         # circular reference, infinite loop)
@@ -510,256 +601,689 @@ class MassScan(PdgParticle):
             raise RuntimeError('Branch already visited: {}'
                                .format(id_particle))
 
+        if id_particle in self._d_mult:
+            return self._d_mult[id_particle]
+
+        l_thresholds = self._get_thresholds()
+
+        # Particles with the same decays (e.g. in different points) have the
+        # same distributions
+        key = (self._get_subtree_hash(id_particle), tuple(l_thresholds))
+        l_mults = self._mult_cache.get(key)
+        if l_mults is not None:
+            self._d_mult[id_particle] = l_mults
+            return l_mults
+
         # If id_particle can be found in d_sm, use this dictionary, otherwise
         # use d_susy
-        if abs(id_particle) in self._d_sm:
+        if id_particle in self._d_sm:
             dct = self._d_sm
         else:
             dct = self._d_susy
 
         # Fill dictionary if not done already
         # id_particle should *never* be a final state here
-        if abs(id_particle) not in dct:
+        if id_particle not in dct:
             self._fill_dict_susy(id_particle)
 
-        for prob, path in dct[abs(id_particle)]:
-            # Skip if below threshold
-            if prob < self._threshold:
+        visited = visited.union((id_particle,))
+
+        # Distributions of the children per decay mode, None for decay modes
+        # below all thresholds
+        l_modes = []
+        for prob, path in dct[id_particle]:
+            # Skip if below all thresholds
+            if prob < min(l_thresholds):
+                l_modes.append(None)
+                continue
+
+            l_mults_children = []
+            for id_child in path:
+                if self._is_final_state(id_child):
+                    l_mults_children.append(
+                        [self._get_multiplicities_final(id_child)] *
+                        len(l_thresholds))
+                else:
+                    l_mults_children.append(
+                        self._get_multiplicities(id_child, visited))
+            l_modes.append(l_mults_children)
+
+        l_mults = self._get_multiplicities_modes(dct[id_particle], l_modes)
+        self._mult_cache.put(key, l_mults)
+
+        self._d_mult[id_particle] = l_mults
+        return l_mults
+
+    def _get_subtree_hash(self, id_particle, visited=frozenset()):
+
+        """ Get hash of the decay subtree of id_particle, which identifies
+        its distributions for the current thresholds (see
+        self._get_multiplicities()). It is made of the decay table of the
+        particle, as it is in the SUSYHIT output file (without translating it
+        into self._d_susy), and the hashes of the children of the decay
+        modes which are not below all thresholds. Final states are hashed by
+        their multiplicities. The hashes are memoized per point in
+        self._d_hash. """
+
+        id_particle = abs(id_particle)
+
+        if id_particle in self._d_hash:
+            return self._d_hash[id_particle]
+
+        # Check if the node has already been visited (which would lead to
+        # circular reference, infinite loop)
+        if id_particle in visited:
+            raise RuntimeError('Branch already visited: {}'
+                               .format(id_particle))
+        visited = visited.union((id_particle,))
+
+        if id_particle in self._d_sm:
+            l_decays = self._d_sm[id_particle]
+        else:
+            l_decays = self._slha.get_decays(id_particle)
+
+        threshold_min = min(self._get_thresholds())
+        l_hashes = []
+        for prob, path in l_decays:
+            # Decay modes below all thresholds (or with a branching ratio of
+            # NaN) are not part of the subtree
+            if not prob >= threshold_min:
                 continue
-            # Divide sample in final states and non final states
-            final, non_final = [tuple(x) for x in self._partition
-                                (lambda y: not self._is_final_state(y), path)]
-            if non_final:
-                visited = visited.union((id_particle,))
-                for node in product(*[self._prob_tree(x, visited)
-                                      for x in non_final]):
-                    new_prob, new_path = reduce(lambda acum, new:
-                                                (acum[0]*new[0],
-                                                 acum[1]+new[1]),
-                                                node, (prob, tuple()))
-                    yield new_prob, final + new_path
+            for id_child in path:
+                if self._is_final_state(id_child):
+                    l_hashes.append(
+                        self._get_multiplicities_final(id_child).shape)
+                else:
+                    l_hashes.append(self._get_subtree_hash(id_child,
+                                                           visited))
+
+        self._d_hash[id_particle] = self._mult_cache.get_hash([l_decays,
+                                                               l_hashes])
+        return self._d_hash[id_particle]
+
+    def _get_multiplicities_modes(self, l_decays, l_modes):
+
+        """ Get the joint distributions of the number of leptons, jets,
+        photons and invisible particles, one per threshold, for the decay
+        modes l_decays, given the distributions of their children l_modes
+        (see self._get_multiplicities()). """
+
+        l_thresholds = self._get_thresholds()
+        # Decay modes (and distributions of their children) which are used
+        # per threshold
+        l_signatures = [[] for _ in l_thresholds]
+        l_probs = [[] for _ in l_thresholds]
+        l_paths = [[] for _ in l_thresholds]
+        for idx_mode, ((prob, _), l_mults_children) in \
+                enumerate(zip(l_decays, l_modes)):
+            if l_mults_children is None:
+                continue
+
+            # Convolve children only once per combination of distributions
+            d_mults_path = {}
+            for idx, threshold in enumerate(l_thresholds):
+                if prob < threshold:
+                    continue
+                key = tuple(id(mults_child[idx])
+                            for mults_child in l_mults_children)
+                if key not in d_mults_path:
+                    mult_path = np.ones((1, 1, 1, 1))
+                    for mults_child in l_mults_children:
+                        mult_path = self._convolve(mult_path,
+                                                   mults_child[idx])
+                    d_mults_path[key] = mult_path
+                l_probs[idx].append(prob)
+                l_paths[idx].append(d_mults_path[key])
+                l_signatures[idx].append((idx_mode, key))
+
+        l_mults = []
+        for idx in range(len(l_thresholds)):
+            if idx and l_signatures[idx] == l_signatures[idx-1]:
+                l_mults.append(l_mults[-1])
             else:
-                yield prob, final
+                l_mults.append(self._get_weighted_sum(l_probs[idx],
+                                                      l_paths[idx]))
+
+        return l_mults
+
+    def _get_multiplicities_final(self, id_particle):
+
+        """ Get the joint distribution of the number of leptons, jets, photons
+        and invisible particles for final state id_particle (see
+        self._get_multiplicities()). """
+
+        category = self._get_category(id_particle)
+
+        # Unknown particles are dropped
+        if category & self._cat_unknown:
+            return np.zeros((0, 0, 0, 0))
+
+        mult = tuple(int(bool(category & cat)) for cat in
+                     [self._cat_lepton, self._cat_jet, self._cat_photon,
+                      self._cat_met])
+        dist = np.zeros(tuple(no+1 for no in mult))
+        dist[mult] = 1.
+        return dist
+
+    def _convolve(self, dist_1, dist_2):  # pylint: disable=no-self-use
+
+        """ Convolve the joint distributions dist_1 and dist_2, which gives
+        the distribution of the sum of both multiplicities. For every
+        non-zero entry of the sparser distribution, the other one is added to
+        the slice shifted by its multiplicities, so each step is one NumPy
+        operation on the whole array. """
+
+        if not dist_1.size or not dist_2.size:
+            return np.zeros((0, 0, 0, 0))
+
+        # Shift the distribution with more entries
+        if np.count_nonzero(dist_1) > np.count_nonzero(dist_2):
+            dist_1, dist_2 = dist_2, dist_1
+
+        dist = np.zeros(tuple(np.add(dist_1.shape, dist_2.shape)-1))
+        for mult in zip(*np.nonzero(dist_1)):
+            dist[tuple(slice(no, no+size) for no, size in
+                       zip(mult, dist_2.shape))] += dist_1[mult]*dist_2
+
+        return dist
+
+    def _get_weighted_sum(self, weights,  # pylint: disable=no-self-use
+                          l_dists):
+
+        """ Get the sum of the joint distributions in l_dists, weighted by
+        weights. The distributions are stacked into one zero-padded array, so
+        that the sum is a single product with the weights. """
+
+        l_dists = [(weight, dist) for weight, dist in zip(weights, l_dists)
+                   if dist.size]
+        if not l_dists:
+            return np.zeros((0, 0, 0, 0))
+
+        stack = np.zeros((len(l_dists),) +
+                         tuple(np.max([dist.shape for _, dist in l_dists],
+                                      axis=0)))
+        for idx, (_, dist) in enumerate(l_dists):
+            stack[(idx,) + tuple(slice(0, no) for no in dist.shape)] = dist
+
+        return np.tensordot([weight for weight, _ in l_dists], stack,
+                            axes=1)
+
+    def _get_marginals(self, dist):  # pylint: disable=no-self-use
+
+        """ Get the distributions [P(0), P(1), ...] of the number of leptons,
+        jets, photons and invisible particles from the joint distribution
+        dist. """
+
+        if not dist.size:
+            return [], [], [], []
+
+        return tuple(dist.sum(axis=tuple(idx for idx in range(4)
+                                         if idx != axis)).tolist()
+                     for axis in range(4))
 
     def _get_br_all(self):
 
         """ Get branching fractions into n particles for all production
         processes. """
 
-        self._br_leptons = []
-        self._br_jets = []
-        self._br_photons = []
+        self._br_joint = np.zeros((0, 0, 0, 0))
+        self._br_error = 0.
+        self._br_thresholds = []
 
         # Don't calculate branching ratios, if threshold is above 1
         if self._threshold >= 1.:
             self._br_leptons = [0]
             self._br_jets = [0]
             self._br_photons = [0]
-        else:
-            xs_incl = self._xs13.get_xs_incl()
-            for idx, xs in enumerate(self._xs13._xs):
-                self._get_brs(self._xs13._p1[idx],
-                              self._xs13._p2[idx], xs/xs_incl)
-
-    def _get_brs(self, id_parent_1, id_parent_2=-1., weight=1.):
-
-        """ Get probabilites for branching into one, two, ... leptons and jets.
-        This includes the combinatorics from 2 parent particles. The
-        probabilities are weighted by weight. """
+            self._br_met = [0]
+            return
+
+        l_processes = self._xs13.get_processes()
+
+        if self._br_engine == 'mc':
+            self._get_br_all_mc(l_processes)
+            return
+
+        if self._precision is not None:
+            # Half of the precision is used for skipping production
+            # processes, the rest for skipping decay modes
+            l_processes, error_processes = \
+                self._prune_processes(l_processes, self._precision/2.)
+            self._budget = self._precision-error_processes
+
+            self._br_joint = self._get_weighted_sum(
+                [weight for _, _, weight in l_processes],
+                [self._get_br_2leg_budget(id_parent_1, id_parent_2, weight)
+                 for id_parent_1, id_parent_2, weight in l_processes])
+            self._br_error = self._precision-self._budget
+            LGR.debug('Discarded probability: %s', self._br_error)
+
+        # Distributions for the thresholds, without precision the first one
+        # is the main result
+        l_joints = []
+        if self._get_thresholds():
+            l_brs_2leg = [self._get_br_2leg(id_parent_1, id_parent_2)
+                          for id_parent_1, id_parent_2, _ in l_processes]
+            l_joints = [self._get_weighted_sum(
+                [weight for _, _, weight in l_processes],
+                [brs_2leg[idx] for brs_2leg in l_brs_2leg])
+                        for idx in range(len(self._get_thresholds()))]
+        if self._precision is None:
+            self._br_joint = l_joints.pop(0)
+
+        self._br_leptons, self._br_jets, self._br_photons, self._br_met = \
+            self._get_marginals(self._br_joint)
+        self._br_thresholds = [self._get_marginals(joint)
+                               for joint in l_joints]
+
+    def _prune_processes(self, l_processes,  # pylint: disable=no-self-use
+                         budget):
+
+        """ Skip the production processes (id_parent_1, id_parent_2, weight)
+        in l_processes with the smallest weights, as long as their total
+        weight stays below budget. Returns the remaining processes (in the
+        original order) and the total weight of the skipped ones. """
+
+        s_skipped = set()
+        weight_skipped = 0.
+        for idx in sorted(range(len(l_processes)),
+                          key=lambda idx: l_processes[idx][2]):
+            if weight_skipped+l_processes[idx][2] > budget:
+                break
+            weight_skipped += l_processes[idx][2]
+            s_skipped.add(idx)
+
+        if s_skipped:
+            LGR.debug('Skip %d of %d production processes with a total '
+                      'weight of %s.', len(s_skipped), len(l_processes),
+                      weight_skipped)
+
+        return [process for idx, process in enumerate(l_processes)
+                if idx not in s_skipped], weight_skipped
+
+    def _get_br_2leg(self, id_parent_1, id_parent_2=-1.):
+
+        """ Get joint distributions of the number of leptons, jets, photons
+        and invisible particles for the production of id_parent_1 and
+        id_parent_2, one per threshold. This includes the combinatorics from 2
+        parent particles. """
 
         # If id_parent_2 is not set, set it to same value as id_parent_1
         if id_parent_2 < 0:
             id_parent_2 = id_parent_1
 
-        br_leptons_1leg_1, br_jets_1leg_1, br_photons_1leg_1 = \
-            self._get_br_1leg(id_parent_1)
-
-        # Don't call self._get_br_1leg() again if both parent particles are the
-        # same
-        if id_parent_2 == id_parent_1:
-            br_leptons_1leg_2 = br_leptons_1leg_1
-            br_jets_1leg_2 = br_jets_1leg_1
-            br_photons_1leg_2 = br_photons_1leg_1
-        else:
-            br_leptons_1leg_2, br_jets_1leg_2, br_photons_1leg_2 = \
-                self._get_br_1leg(id_parent_2)
-
-        # Create list with right length
-        br_leptons_2leg = [0]*(len(br_leptons_1leg_1)+len(br_leptons_1leg_2)-1)
-        br_jets_2leg = [0]*(len(br_jets_1leg_1)+len(br_jets_1leg_2)-1)
-        br_photons_2leg = [0]*(len(br_photons_1leg_1)+len(br_photons_1leg_2)-1)
-
-        # Combinatorics going from one leg to two legs
-        for idx_l1, br_l1 in enumerate(br_leptons_1leg_1):
-            for idx_l2, br_l2 in enumerate(br_leptons_1leg_2):
-                br_leptons_2leg[idx_l1+idx_l2] += br_l1*br_l2
-
-        for idx_j1, br_j1 in enumerate(br_jets_1leg_1):
-            for idx_j2, br_j2 in enumerate(br_jets_1leg_2):
-                br_jets_2leg[idx_j1+idx_j2] += br_j1*br_j2
-
-        for idx_l1, br_l1 in enumerate(br_photons_1leg_1):
-            for idx_l2, br_l2 in enumerate(br_photons_1leg_2):
-                br_photons_2leg[idx_l1+idx_l2] += br_l1*br_l2
+        # Combinatorics going from one leg to two legs, only once per
+        # combination of distributions
+        d_brs_2leg = {}
+        l_brs_2leg = []
+        for br_1leg_1, br_1leg_2 in zip(self._get_br_1leg(id_parent_1),
+                                        self._get_br_1leg(id_parent_2)):
+            key = (id(br_1leg_1), id(br_1leg_2))
+            if key not in d_brs_2leg:
+                d_brs_2leg[key] = self._convolve(br_1leg_1, br_1leg_2)
+            l_brs_2leg.append(d_brs_2leg[key])
 
         # If total branching ratio (for both legs) is under a certain
         # threshold, throw a warning; this can have many reasons, like unknown
         # (ignored) particle decays, or thresholds to limit computing time
-        #if sum(br_leptons_2leg) < .9:
+        #if l_brs_2leg[0].sum() < .9:
         #    LGR.warning('The defined threshold led to a total branching '
         #                'ratio of %s. You might want to consider lowering the '
-        #                'threshold.', sum(br_leptons_2leg))
+        #                'threshold.', l_brs_2leg[0].sum())
 
         LGR.debug('Parent particle (1st leg): %s', id_parent_1)
         LGR.debug('Parent particle (2nd leg): %s', id_parent_2)
-        LGR.debug('Branching ratios into leptons (1st leg): %s',
-                  br_leptons_1leg_1)
-        LGR.debug('Branching ratios into leptons (2nd leg): %s',
-                  br_leptons_1leg_2)
-        LGR.debug('Branching ratios into leptons (both legs): %s',
-                  br_leptons_2leg)
-
-        # Fill class variables
-        for idx, br in enumerate(br_leptons_2leg):
-            try:
-                self._br_leptons[idx] += weight*br
-            except IndexError:
-                self._br_leptons.append(weight*br)
-        for idx, br in enumerate(br_jets_2leg):
-            try:
-                self._br_jets[idx] += weight*br
-            except IndexError:
-                self._br_jets.append(weight*br)
-        for idx, br in enumerate(br_photons_2leg):
-            try:
-                self._br_photons[idx] += weight*br
-            except IndexError:
-                self._br_photons.append(weight*br)
+        if l_brs_2leg:
+            LGR.debug('Branching ratios (both legs): %s', l_brs_2leg[0])
+
+        return l_brs_2leg
 
     def _get_br_1leg(self, id_parent):
 
-        """ Get branching ratio into particles for one particle. """
+        """ Get joint distributions of the number of leptons, jets, photons
+        and invisible particles for one particle, one per threshold. The
+        result is stored per point, particles and antiparticles share it. The
+        returned arrays must not be changed. """
 
-        br_leptons_1leg = []
-        br_jets_1leg = []
-        br_photons_1leg = []
+        if abs(id_parent) in self._d_br_1leg:
+            return self._d_br_1leg[abs(id_parent)]
 
         LGR.debug('Branching ratios for particle %s:', id_parent)
 
-        # Loop over all decay modes
-        for list_decay in self._prob_tree(id_parent):
+        # A stable parent (e.g. LSP production) is its own final state
+        if self._is_final_state(id_parent):
+            l_brs_1leg = [self._get_multiplicities_final(id_parent)] * \
+                len(self._get_thresholds())
+        else:
+            l_brs_1leg = self._get_multiplicities(id_parent)
 
-            LGR.debug('list_decay: %s', list_decay)
+        # If a distribution is empty, we don't get any particles
+        br_none = np.ones((1, 1, 1, 1))
+        l_brs_1leg = [br_1leg if br_1leg.size else br_none
+                      for br_1leg in l_brs_1leg]
+
+        LGR.debug('Branching ratios: %s', l_brs_1leg[0])
+        LGR.debug('Total branching ratio: %s', l_brs_1leg[0].sum())
+
+        self._d_br_1leg[abs(id_parent)] = l_brs_1leg
+        return l_brs_1leg
+
+    def _get_br_2leg_budget(self, id_parent_1, id_parent_2, weight):
+
+        """ Get joint distribution of the number of leptons, jets, photons
+        and invisible particles for the production of id_parent_1 and
+        id_parent_2 with weight weight, if a precision is set (see
+        self._get_multiplicities_budget()). """
+
+        # If id_parent_2 is not set, set it to same value as id_parent_1
+        if id_parent_2 < 0:
+            id_parent_2 = id_parent_1
+
+        # If a distribution is empty, we don't get any particles (see
+        # self._get_br_1leg())
+        l_brs_1leg = []
+        for id_parent in [id_parent_1, id_parent_2]:
+            if self._is_final_state(id_parent):
+                br_1leg = self._get_multiplicities_final(id_parent)
+            else:
+                br_1leg = self._get_multiplicities_budget(id_parent,
+                                                          weight)[0]
+            l_brs_1leg.append(br_1leg if br_1leg.size else
+                              np.ones((1, 1, 1, 1)))
+
+        return self._convolve(*l_brs_1leg)
+
+    def _get_multiplicities_budget(self, id_particle, reach,
+                                   visited=frozenset()):
+
+        """ Get the joint distribution of the number of leptons, jets,
+        photons and invisible particles in the decay of id_particle (see
+        self._get_multiplicities()), which is reached with probability reach
+        in the current point, and an upper bound on the probability which is
+        discarded in it. Instead of a fixed threshold, a decay mode is
+        skipped if the probability to reach it (reach times its branching
+        ratio) fits into the probability which may still be discarded,
+        self._budget, which is reduced accordingly. So the whole point is
+        processed in one pass and the precision is never exceeded. The
+        smallest decay modes of every particle are skipped first. The
+        results are memoized in self._d_mult_budget and used again for the
+        same particle if the probability discarded in it, weighted by reach,
+        still fits into the budget. """
+
+        id_particle = abs(id_particle)
+
+        # Check if the node has already been visited (which would lead to
+        # circular reference, infinite loop)
+        if id_particle in visited:
+            raise RuntimeError('Branch already visited: {}'
+                               .format(id_particle))
+
+        if id_particle in self._d_mult_budget:
+            mult, pruned = self._d_mult_budget[id_particle]
+            if reach*pruned <= self._budget:
+                self._budget -= reach*pruned
+                return mult, pruned
+
+        # If id_particle can be found in d_sm, use this dictionary, otherwise
+        # use d_susy
+        if id_particle in self._d_sm:
+            dct = self._d_sm
+        else:
+            dct = self._d_susy
 
-            br_single = list_decay[0]
-
-            # Check if we have unknown particles in the final state
-            has_unknowns = False
-
-            # Calculate number of particles for specific decay mode
-            no_leptons = 0
-            no_jets = 0
-            no_photons = 0
-            for id_particle in list_decay[1]:
-                if self._is_unknown(id_particle):
-                    has_unknowns = True
-                no_leptons += self._is_lepton(id_particle)
-                no_jets += self._is_jet(id_particle)
-                no_photons += self._is_photon(id_particle)
-
-            # Calculate total branching ratio for consistency;
-            # this number will not exactly add up to 1, since rare decay modes
-            # are missing and due to obnoxious python rounding errors
-            if has_unknowns:
+        # Fill dictionary if not done already
+        # id_particle should *never* be a final state here
+        if id_particle not in dct:
+            self._fill_dict_susy(id_particle)
+
+        visited = visited.union((id_particle,))
+
+        l_probs = []
+        l_paths = []
+        pruned = 0.
+        for prob, path in sorted(dct[id_particle],
+                                 key=lambda decay: decay[0]):
+            if reach*prob <= self._budget:
+                self._budget -= reach*prob
+                pruned += prob
                 continue
 
-            # Make sure lists are long enough
-            self._expand_list(br_leptons_1leg, no_leptons)
-            self._expand_list(br_jets_1leg, no_jets)
-            self._expand_list(br_photons_1leg, no_photons)
+            mult_path = np.ones((1, 1, 1, 1))
+            pruned_path = 0.
+            for id_child in path:
+                if self._is_final_state(id_child):
+                    mult_child = self._get_multiplicities_final(id_child)
+                else:
+                    mult_child, pruned_child = \
+                        self._get_multiplicities_budget(id_child, reach*prob,
+                                                        visited)
+                    pruned_path += pruned_child
+                mult_path = self._convolve(mult_path, mult_child)
+            l_probs.append(prob)
+            l_paths.append(mult_path)
+            pruned += prob*min(1., pruned_path)
+
+        mult = self._get_weighted_sum(l_probs, l_paths)
+        self._d_mult_budget[id_particle] = (mult, pruned)
+        return mult, pruned
+
+    def _get_br_all_mc(self, l_processes):
+
+        """ Get branching fractions into n particles for the production
+        processes (id_parent_1, id_parent_2, weight) in l_processes by
+        sampling self._mc_samples decay chains. All samples are processed at
+        the same time: in every step, all particles which have not decayed
+        yet are decayed at once per particle type. Samples which end up in
+        unknown particles or in the part of the decay table which is not
+        listed are dropped, as in the exact calculation. As there, a leg
+        whose decays all end up in unknown particles (e.g. a particle without
+        decay modes) counts as a leg without any particles (see
+        self._get_br_1leg() and self._is_unknown_leg()). """
+
+        # Without production processes, the branching ratios stay empty and
+        # the point is skipped, as in the exact calculation
+        if not l_processes:
+            self._br_leptons, self._br_jets, self._br_photons, \
+                self._br_met = [], [], [], []
+            self._br_leptons_err, self._br_jets_err, self._br_photons_err, \
+                self._br_met_err = [], [], [], []
+            return
+
+        # pylint: disable=invalid-name
+        n = self._mc_samples
+        rng = np.random.RandomState(self._mc_seed)
+
+        # Choose production process per sample
+        cum_weights = np.cumsum([weight for _, _, weight in l_processes])
+        idx_processes = np.minimum(
+            np.searchsorted(cum_weights, rng.random_sample(n)*cum_weights[-1],
+                            side='right'), len(l_processes)-1)
+        # If id_parent_2 is not set, set it to same value as id_parent_1
+        # (see self._get_br_2leg())
+        l_parents = [(id_parent_1, id_parent_1 if id_parent_2 < 0 else
+                      id_parent_2) for id_parent_1, id_parent_2, _ in
+                     l_processes]
+        ids = np.abs(np.concatenate(
+            [np.array([parents[leg] for parents in l_parents])[idx_processes]
+             for leg in range(2)]))
+        samples = np.concatenate([np.arange(n), np.arange(n)])
+
+        # Legs which can only end up in unknown particles don't contribute
+        # any particles
+        known = ~np.in1d(ids, [id_particle for id_particle in np.unique(ids)
+                               if self._is_unknown_leg(id_particle)])
+        samples = samples[known]
+        ids = ids[known]
+
+        # Multiplicities (leptons, jets, photons, met) per sample
+        mults = np.zeros((n, 4), dtype=int)
+        alive = np.ones(n, dtype=bool)
+
+        for _ in range(self._mc_depth_max):
+            if not ids.size:
+                break
+
+            # Count all final states at once, drop samples with unknown
+            # particles
+            categories = self._get_categories(ids)
+            final = (categories & self._cat_final_state) > 0
+            alive[samples[(categories & self._cat_unknown) > 0]] = False
+            np.add.at(mults, samples[final],
+                      np.stack([(categories[final] & cat) > 0 for cat in
+                                [self._cat_lepton, self._cat_jet,
+                                 self._cat_photon, self._cat_met]],
+                               axis=1).astype(int))
+            samples = samples[~final]
+            ids = ids[~final]
+
+            l_samples = []
+            l_ids = []
+            for id_particle in np.unique(ids):
+                samples_particle = samples[ids == id_particle]
+
+                cum_probs, children = self._get_mc_table(id_particle)
+                modes = np.searchsorted(cum_probs,
+                                        rng.random_sample(
+                                            samples_particle.size),
+                                        side='right')
+                lost = modes == cum_probs.size
+                alive[samples_particle[lost]] = False
+                children = children[modes[~lost]]
+                mask = children != 0
+                l_samples.append(np.repeat(samples_particle[~lost],
+                                           mask.sum(axis=1)))
+                l_ids.append(children[mask])
+
+            samples = np.concatenate(l_samples) if l_samples else \
+                np.zeros(0, dtype=int)
+            ids = np.concatenate(l_ids) if l_ids else np.zeros(0, dtype=int)
+        else:
+            raise RuntimeError('Decay chains are longer than {} steps.'
+                               .format(self._mc_depth_max))
+
+        mults = mults[alive]
+        if mults.size:
+            self._br_joint = np.zeros(tuple(mults.max(axis=0)+1))
+            np.add.at(self._br_joint, tuple(mults.T), 1./n)
+        self._br_leptons, self._br_jets, self._br_photons, self._br_met = \
+            self._get_marginals(self._br_joint)
+
+        # Binomial uncertainties
+        self._br_leptons_err, self._br_jets_err, self._br_photons_err, \
+            self._br_met_err = [[(br*(1.-br)/n)**.5 for br in brs] for brs in
+                                [self._br_leptons, self._br_jets,
+                                 self._br_photons, self._br_met]]
 
-            # Fill branching ratio
-            br_leptons_1leg[no_leptons] += br_single
-            br_jets_1leg[no_jets] += br_single
-            br_photons_1leg[no_photons] += br_single
+    def _is_unknown_leg(self, id_particle, visited=frozenset()):
 
-        # If all lists are empty, we don't get any particles (LSP production)
-        if not (br_leptons_1leg and br_jets_1leg and br_photons_1leg):
-            br_leptons_1leg = [1]
-            br_jets_1leg = [1]
-            br_photons_1leg = [1]
+        """ Return True if all decays of id_particle end up in unknown
+        particles, i.e. if its distribution in the exact calculation (without
+        threshold) is empty. The results are stored per point. """
 
-        LGR.debug('Branching ratios into leptons: %s', br_leptons_1leg)
-        LGR.debug('Branching ratios into jets: %s', br_jets_1leg)
-        LGR.debug('Branching ratios into photons: %s', br_photons_1leg)
-        LGR.debug('Total branching ratio: %s', sum(br_leptons_1leg))
+        id_particle = abs(id_particle)
+        if id_particle in self._d_mc_unknown:
+            return self._d_mc_unknown[id_particle]
 
-        return br_leptons_1leg, br_jets_1leg, br_photons_1leg
+        if self._is_final_state(id_particle):
+            return bool(self._get_category(id_particle) & self._cat_unknown)
 
-    def _expand_list(self, lst, idx, val=0.):  # pylint: disable=no-self-use
+        # Check if the node has already been visited (which would lead to
+        # circular reference, infinite loop)
+        if id_particle in visited:
+            raise RuntimeError('Branch already visited: {}'
+                               .format(id_particle))
+        visited = visited.union((id_particle,))
 
-        """ Expand list so it has at least idx entries. """
+        # If id_particle can be found in d_sm, use this dictionary, otherwise
+        # use d_susy
+        if id_particle in self._d_sm:
+            dct = self._d_sm
+        else:
+            dct = self._d_susy
+        if id_particle not in dct:
+            self._fill_dict_susy(id_particle)
 
-        while len(lst) <= idx:
-            lst.append(val)
+        self._d_mc_unknown[id_particle] = all(
+            any(self._is_unknown_leg(id_child, visited) for id_child in path)
+            for _, path in dct[id_particle])
+        return self._d_mc_unknown[id_particle]
+
+    def _get_mc_table(self, id_particle):
+
+        """ Get decay table of id_particle for self._get_br_all_mc(): the
+        cumulative branching ratios and the children per decay mode (as
+        matrix, filled up with 0's). The tables are stored per point. """
+
+        id_particle = abs(id_particle)
+        if id_particle in self._d_mc_table:
+            return self._d_mc_table[id_particle]
+
+        # If id_particle can be found in d_sm, use this dictionary, otherwise
+        # use d_susy
+        if id_particle in self._d_sm:
+            dct = self._d_sm
+        else:
+            dct = self._d_susy
+        if id_particle not in dct:
+            self._fill_dict_susy(id_particle)
 
-    def _skip_point(self, coordinate_x,  # pylint: disable=no-self-use
-                    coordinate_y):
+        len_max = max(len(path) for _, path in dct[id_particle])
+        children = np.zeros((len(dct[id_particle]), len_max), dtype=int)
+        for idx, (_, path) in enumerate(dct[id_particle]):
+            children[idx, :len(path)] = np.abs(path)
 
-        """ Throw warning that point (x/y) will be skipped. """
+        self._d_mc_table[id_particle] = \
+            (np.cumsum([prob for prob, _ in dct[id_particle]]), children)
+        return self._d_mc_table[id_particle]
 
-        self._error = True
-        LGR.warning('Skip point (%4d/%4d).', coordinate_x, coordinate_y)
+    def _skip_point(self, job):  # pylint: disable=no-self-use
 
-    def _fill_lists(self, lst_in, lst_outs, default=0):  # pylint: disable=no-self-use
+        """ Throw warning that point job will be skipped. """
 
-        """ Append list lst_in to list of lists lst_outs:
-        lst_in = [0, 1]
-        lst_outs[0] = [..., 0]
-        lst_outs[1] = [..., 1]
-        lst_outs[2] = [..., default]
-        ... """
+        job['error'] = True
+        LGR.warning('Skip point (%4d/%4d).', job['prmtr_x'], job['prmtr_y'])
 
-        for idx, lst_out in enumerate(lst_outs):
-            lst_out.append(get_lst_entry_default(lst_in, idx, default))
+    def _apply_k_factor(self, dir_point):
 
-    def _apply_k_factor(self):
+        """ Write a copy of the SUSYHIT output file in directory dir_point
+        (susyhit_slha_nlo.out) with the K-factor applied to the LO cross
+        sections, which is only needed for SModelS; everything else applies
+        the k-factors in memory (see CrossSection). The k-factors differ for
+        strong and weak production. They have to be calculated separately.
+        """
 
-        """ Apply K-factor to LO cross sections. The k-factors differ for
-        strong and weak production. They have to be calculated separately.  """
+        with open('{}/susyhit_slha.out'.format(dir_point), 'r') as f_susyhit:
+            lines = f_susyhit.readlines()
 
-        # Use fileinput.input to do inline editing
         found_xsec = False
         strong_xsec = False
-        for line in input('{}/susyhit_slha.out'
-                          .format(self._dir_susyhit), inplace=True):
-            if found_xsec:
-
-                if strong_xsec:
-                    k_factor = self._k_strong
-                else:
-                    k_factor = self._k_weak
+        with open('{}/susyhit_slha_nlo.out'.format(dir_point),
+                  'w') as f_susyhit:
+            for line in lines:
+                if found_xsec:
 
-                list_line = line.split()
-                list_line[6] = str(k_factor*float(list_line[6]))
-                line_new = ' '.join(list_line)
+                    if strong_xsec:
+                        k_factor = self._k_strong
+                    else:
+                        k_factor = self._k_weak
 
-                # The print statement is redirected to the file
-                print line_new
+                    list_line = line.split()
+                    list_line[6] = str(k_factor*float(list_line[6]))
+                    f_susyhit.write('{}\n'.format(' '.join(list_line)))
 
-                found_xsec = False
-                strong_xsec = False
-                continue
+                    found_xsec = False
+                    strong_xsec = False
+                    continue
 
-            # If the xs matches, set bool, next line will have the xs
-            if search('XSECTION', line):
-                found_xsec = True
-                # Check if strong production
-                if self._is_strong(float(line.split()[5])) and \
-                   self._is_strong(float(line.split()[6])):
-                    strong_xsec = True
+                # If the xs matches, set bool, next line will have the xs
+                if search('XSECTION', line):
+                    found_xsec = True
+                    # Check if strong production
+                    if self._is_strong(float(line.split()[5])) and \
+                       self._is_strong(float(line.split()[6])):
+                        strong_xsec = True
 
-            print line,
+                f_susyhit.write(line)
 
     def _get_xs(self):
 
@@ -768,9 +1292,12 @@ class MassScan(PdgParticle):
         self._xs13 = CrossSection()
         self._xs8 = CrossSection()
 
-        # Get cross sections from SLHA, both for 13 and 8 TeV
-        self._xs13.get_xs(13, self._dir_susyhit)
-        self._xs8.get_xs(8, self._dir_susyhit)
+        # Get cross sections from SLHA, both for 13 and 8 TeV, and apply
+        # k-factors
+        self._xs13.get_xs(13, self._slha)
+        self._xs8.get_xs(8, self._slha)
+        self._xs13.set_k_factors(self._k_strong, self._k_weak)
+        self._xs8.set_k_factors(self._k_strong, self._k_weak)
 
         # Get dominant production process
         self._dom_id1, self._dom_id2 = self._xs13.get_xs_dominant()
@@ -786,12 +1313,57 @@ class MassScan(PdgParticle):
         # Get gluino gluino cross section
         self._xs13_gluinos = self._xs13.get_xs_particle(self._id_gluino)
 
-    def _get_mu(self):  # pylint: disable=no-self-use
+    def _run_smodels(self, job, smodels_service):
+
+        """ Get excluded observed signal strength for point job, from
+        smodels_service if possible, otherwise by running runSModelS. """
 
-        """ Get excluded observed signal strength from SModelS output file. """
+        # SModelS needs the cross sections with k-factors
+        self._apply_k_factor(job['dir'])
+
+        if self._use_smodels_service:
+            try:
+                mu = smodels_service.get_r(  # pylint: disable=invalid-name
+                    '{}/susyhit_slha_nlo.out'.format(job['dir']))
+            except ValueError as exc:
+                LGR.warning('SModelS service failed for this point (%s), run '
+                            'runSModelS instead.', exc)
+            except RuntimeError as exc:
+                LGR.warning('SModelS service failed (%s), run runSModelS '
+                            'from now on.', exc)
+                self._use_smodels_service = False
+            else:
+                # Keep the result in the same format as runSModelS, so that
+                # it can be used by self.reprocess()
+                with open('smodels_summary_{}_{}.txt'
+                          .format(job['prmtr_x'], job['prmtr_y']),
+                          'w') as f_smodels:
+                    f_smodels.write('The highest r value is = {}\n'
+                                    .format(mu))
+                return mu
+
+        cmd = 'timeout 1800 runSModelS -o {0}/smodels_summary.txt ' \
+              '-f {0}/susyhit_slha_nlo.out'.format(job['dir'])
+        if self._smodels_parameters is not None:
+            cmd += ' -p {}'.format(self._smodels_parameters)
+        self._run_external('SModelS', cmd, False)
+        # pylint: disable=invalid-name
+        mu = self._get_mu('{}/smodels_summary.txt'.format(job['dir']))
+
+        # Move SModelS output file
+        system('mv {}/smodels_summary.txt smodels_summary_{}_{}.txt '
+               '2>/dev/null'.format(job['dir'], job['prmtr_x'],
+                                    job['prmtr_y']))
+
+        return mu
+
+    def _get_mu(self, filename):  # pylint: disable=no-self-use
+
+        """ Get excluded observed signal strength from SModelS output file
+        filename. """
 
         try:
-            with open('smodels_summary.txt', 'r') as f_smodels:
+            with open(filename, 'r') as f_smodels:
                 for line in f_smodels:
                     if line.startswith('The highest r value is'):
                         return float(line.rstrip().split()[-1])
@@ -827,16 +1399,11 @@ class MassScan(PdgParticle):
 
         """ Return mass of particle with ID id_particle. """
 
-        with open('{}/susyhit_slha.out'
-                  .format(self._dir_susyhit), 'r') as f_susyhit:
-            f_susyhit_mass = dropwhile(lambda l: not search('^BLOCK MASS', l),
-                                       f_susyhit)
-            for line in f_susyhit_mass:
-                if search('^ *{}'.format(id_particle), line):
-                    mass = float((line.split())[1])
-                    LGR.debug('Found mass %s for particle %s from line %s.',
-                              mass, id_particle, line.rstrip())
-                    return abs(mass)
+        mass = self._slha.get_mass(id_particle)
+        LGR.debug('Found mass %s for particle %s.', mass, id_particle)
+        if mass is None:
+            return None
+        return abs(mass)
 
     def _get_ctau(self):
 
@@ -850,32 +1417,28 @@ class MassScan(PdgParticle):
 
         """ Return lifetime of particle with ID id_particle. """
 
-        with open('{}/susyhit_slha.out'
-                  .format(self._dir_susyhit), 'r') as f_susyhit:
-            for line in f_susyhit:
-                if search('^DECAY *{}'.format(id_particle), line):
-                    try:
-                        lifetime = 1./(float((line.split())[2])*1.51926778e24)
-                    except ZeroDivisionError:
-                        lifetime = 0.
-                    return lifetime
-
-    def _check_lsp(self):
-
-        """ Check that the LSP is a neutralino1. """
-
-        min_mass = '1e10'
-
-        with open('{}/susyhit_slha.out'
-                  .format(self._dir_susyhit), 'r') as f_susyhit:
-            for line in f_susyhit:
-                # Check for SUSY masses
-                if search('^ *[12]000', line):
-                    mass = abs(float((line.split())[1]))
-                    id_particle = int((line.split())[0])
-                    if mass < min_mass:
-                        min_mass = mass
-                        min_id = id_particle
+        width = self._slha.get_width(id_particle)
+        if width is None:
+            LGR.warning('No decay table found for particle %s.', id_particle)
+            return 0.
+
+        try:
+            lifetime = 1./(width*1.51926778e24)
+        except ZeroDivisionError:
+            lifetime = 0.
+        return lifetime
+
+    def _check_lsp(self, filename):  # pylint: disable=no-self-use
+
+        """ Check that the LSP in SUSYHIT output file filename is a
+        neutralino1. """
+
+        # Only consider SUSY masses
+        with SlhaReader(filename) as slha:
+            d_masses = slha.get_masses()
+        min_id = min((id_particle for id_particle in d_masses
+                      if 1000000 <= id_particle < 3000000),
+                     key=lambda id_particle: abs(d_masses[id_particle]))
         if min_id == 1000022:
             return True
         else:
@@ -888,6 +1451,75 @@ class MassScan(PdgParticle):
         this value, the more precise, but the slower the computation. """
 
         self._threshold = threshold
+        self._d_mult.clear()
+        self._d_hash.clear()
+        self._d_br_1leg.clear()
+
+    def set_smodels_parameters(self, filename):
+
+        """ Set SModelS parameter file filename (sigmacut, minmassgap, ...),
+        which is used both by the SModelS service and runSModelS, so that
+        they give the same results (None: default file of runSModelS). """
+
+        self._smodels_parameters = filename
+        self._smodels_service.stop()
+        self._smodels_service = SModelSService(filename_parameters=filename)
+
+    def set_k_factors(self, k_strong, k_weak):
+
+        """ Set k-factors for strong and weak production, which are applied
+        to the LO cross sections. They can also be changed for
+        self.reprocess(), without running xseccomputer again. The signal
+        strength is only calculated with the k-factors of the original
+        scan. """
+
+        self._k_strong = k_strong
+        self._k_weak = k_weak
+
+    def set_br_engine(self, engine, samples=10000, seed=None):
+
+        """ Set how the branching ratios are calculated: 'exact' sums all
+        decay chains above the threshold, 'mc' samples samples decay chains
+        per point (threshold and precision are not used). The statistical
+        uncertainties of the 'mc' branching ratios are plotted as well. With
+        a seed, every point uses the same random numbers, so the
+        fluctuations are correlated between points and the plots are smooth;
+        the results then also don't depend on the order of the points. """
+
+        if engine not in ['exact', 'mc']:
+            raise ValueError('BR engine has to be "exact" or "mc".')
+
+        self._br_engine = engine
+        self._mc_samples = samples
+        self._mc_seed = seed
+
+    def set_precision(self, precision):
+
+        """ Set maximum probability per point which may be discarded in the
+        branching ratios (None to switch it off). Half of it is used to skip
+        the production processes with the smallest cross sections; the rest
+        is used to skip decay modes in the decay trees, instead of the
+        threshold (see self.set_threshold() and
+        self._get_multiplicities_budget()). The upper bound on the discarded
+        probability is plotted as br_error. The additional thresholds (see
+        self.set_thresholds()) are still used as thresholds; only they use
+        the multiplicity cache (see self.set_mult_cache()). """
+
+        self._precision = precision
+
+    def set_thresholds(self, l_thresholds):
+
+        """ Set additional thresholds for which the branching ratios are
+        calculated, in the same pass as for the threshold (see
+        self.set_threshold()). Parts of the decays which don't depend on the
+        threshold are only calculated once. The branching ratios for every
+        threshold are plotted next to the others, e.g. br_1_leptons_thr0.01.
+        Only used for the exact calculation. """
+
+        self._l_thresholds = list(l_thresholds)
+        self._d_mult.clear()
+        self._d_hash.clear()
+        self._d_br_1leg.clear()
 
     def _reset(self):
 
@@ -924,27 +1556,31 @@ class MassScan(PdgParticle):
         self._dom_id2 = 0
         self._xs13 = CrossSection()
         self._xs8 = CrossSection()
-        self._dc_gluino = DecayChannel()
-        self._dc_chargino1 = DecayChannel()
-        self._dc_chargino2 = DecayChannel()
-        self._dc_neutralino2 = DecayChannel()
-        self._dc_neutralino3 = DecayChannel()
-        self._dc_neutralino4 = DecayChannel()
-        self._dc_sdown_l = DecayChannel()
-        self._dc_sdown_r = DecayChannel()
-        self._dc_sup_l = DecayChannel()
-        self._dc_sup_r = DecayChannel()
-        self._dc_sstrange_l = DecayChannel()
-        self._dc_sstrange_r = DecayChannel()
-        self._dc_scharm_l = DecayChannel()
-        self._dc_scharm_r = DecayChannel()
+        self._dc = self._get_dcs_empty()
         self._br_leptons = []
         self._br_jets = []
         self._br_photons = []
+        self._br_met = []
+        self._br_joint = np.zeros((0, 0, 0, 0))
+        self._br_error = 0.
+        self._br_leptons_err = []
+        self._br_jets_err = []
+        self._br_photons_err = []
+        self._br_met_err = []
+        self._br_thresholds = []
+
+    def _get_dcs_empty(self):  # pylint: disable=no-self-use
+
+        """ Get decay channels of a point without any decays. """
+
+        return np.zeros((len(MassScanPlots.l_dc_names),
+                         DecayChannel.no_channels_max),
+                        dtype=DecayChannel.dtype)
 
     def _get_dcs(self, id_particle):
 
-        """ Fill lists with decays for particle with id particle_id. """
+        """ Get DecayChannel object with the decays of particle with id
+        particle_id. """
 
         # Create decay_channel object
         dc_obj = DecayChannel()
@@ -961,107 +1597,669 @@ class MassScan(PdgParticle):
 
     def _fill_plots(self, plots, prmtr_x, prmtr_y):
 
-        """ Fill all lists in the MassScanPlots object. """
+        """ Add the current point as one row to the MassScanPlots object. """
 
         # Fill the coordinates
-        plots.coordinate_x.append(prmtr_x)
-        plots.coordinate_y.append(prmtr_y)
+        d_row = {'coordinate_x': prmtr_x, 'coordinate_y': prmtr_y}
 
         # Plots for masses
         if self._calc_masses:
-            plots.m_gluino.append(self._m_gluino)
-            plots.m_neutralino1.append(self._m_neutralino1)
-            plots.m_neutralino2.append(self._m_neutralino2)
-            plots.m_neutralino3.append(self._m_neutralino3)
-            plots.m_neutralino4.append(self._m_neutralino4)
-            plots.m_chargino1.append(self._m_chargino1)
-            plots.m_chargino2.append(self._m_chargino2)
-            plots.m_stop1.append(self._m_stop1)
-            plots.m_stop2.append(self._m_stop2)
-            plots.m_smhiggs.append(self._m_smhiggs)
-            plots.m_sdown_l.append(self._m_sdown_l)
-            plots.m_sdown_r.append(self._m_sdown_r)
-            plots.m_sup_l.append(self._m_sup_l)
-            plots.m_sup_r.append(self._m_sup_r)
-            plots.m_sstrange_l.append(self._m_sstrange_l)
-            plots.m_sstrange_r.append(self._m_sstrange_r)
-            plots.m_scharm_l.append(self._m_scharm_l)
-            plots.m_scharm_r.append(self._m_scharm_r)
+            for name in ['gluino', 'neutralino1', 'neutralino2',
+                         'neutralino3', 'neutralino4', 'chargino1',
+                         'chargino2', 'stop1', 'stop2', 'smhiggs', 'sdown_l',
+                         'sdown_r', 'sup_l', 'sup_r', 'sstrange_l',
+                         'sstrange_r', 'scharm_l', 'scharm_r']:
+                d_row['m_{}'.format(name)] = getattr(self,
+                                                     '_m_{}'.format(name))
 
         # Plots for lifetimes
         if self._calc_br:
-            plots.ct_gluino.append(self._ct_gluino)
-            plots.ct_chargino1.append(self._ct_chargino1)
-            plots.ct_neutralino2.append(self._ct_neutralino2)
+            d_row['ct_gluino'] = self._ct_gluino
+            d_row['ct_chargino1'] = self._ct_chargino1
+            d_row['ct_neutralino2'] = self._ct_neutralino2
 
         # Plots for xs's
         if self._calc_xs:
-            plots.xs13_incl.append(self._xs13_incl)
-            plots.xs8_incl.append(self._xs8_incl)
+            d_row['xs13_incl'] = self._xs13_incl
+            d_row['xs8_incl'] = self._xs8_incl
             try:
-                plots.xs13_strong.append(self._xs13_strong/self._xs13_incl)
-                plots.xs8_strong.append(self._xs13_strong/self._xs13_incl)
-                plots.xs13_gluinos.append(self._xs13_gluinos/self._xs13_incl)
+                d_row['xs13_strong'] = self._xs13_strong/self._xs13_incl
+                d_row['xs8_strong'] = self._xs13_strong/self._xs13_incl
+                d_row['xs13_gluinos'] = self._xs13_gluinos/self._xs13_incl
             except ZeroDivisionError:
-                plots.xs13_strong.append(0.)
-                plots.xs8_strong.append(0.)
-                plots.xs13_gluinos.append(0.)
+                d_row['xs13_strong'] = 0.
+                d_row['xs8_strong'] = 0.
+                d_row['xs13_gluinos'] = 0.
 
         # Plots for decay channels
         if self._calc_br:
-            plots.dc_gluino.append(self._dc_gluino)
-            plots.dc_chargino1.append(self._dc_chargino1)
-            plots.dc_chargino2.append(self._dc_chargino2)
-            plots.dc_neutralino2.append(self._dc_neutralino2)
-            plots.dc_neutralino3.append(self._dc_neutralino3)
-            plots.dc_neutralino4.append(self._dc_neutralino4)
-            plots.dc_sdown_l.append(self._dc_sdown_l)
-            plots.dc_sdown_r.append(self._dc_sdown_r)
-            plots.dc_sup_l.append(self._dc_sup_l)
-            plots.dc_sup_r.append(self._dc_sup_r)
-            plots.dc_sstrange_l.append(self._dc_sstrange_l)
-            plots.dc_sstrange_r.append(self._dc_sstrange_r)
-            plots.dc_scharm_l.append(self._dc_scharm_l)
-            plots.dc_scharm_r.append(self._dc_scharm_r)
-
-        # Fill lists per number of object for br plots
+            d_row['dc'] = self._dc
+
+        # Branching ratios per number of objects
         if self._calc_br:
-            plots.dom_id1.append(self._dom_id1)
-            plots.dom_id2.append(self._dom_id2)
-            self._fill_lists(self._br_leptons, plots.br_leptons)
-            self._fill_lists(self._br_jets, plots.br_jets)
-            self._fill_lists(self._br_photons, plots.br_photons)
+            d_row['dom_id1'] = self._dom_id1
+            d_row['dom_id2'] = self._dom_id2
+            d_row['br_leptons'] = self._br_leptons
+            d_row['br_jets'] = self._br_jets
+            d_row['br_photons'] = self._br_photons
+            d_row['br_met'] = self._br_met
+            d_row['br_joint'] = self._br_joint
+            if self._precision is not None and self._br_engine == 'exact':
+                d_row['br_error'] = self._br_error
+            if plots.thresholds:
+                for idx, particles in enumerate(['leptons', 'jets',
+                                                 'photons', 'met']):
+                    d_row['br_{}_thr'.format(particles)] = \
+                        [brs[idx] for brs in self._br_thresholds]
+            if self._br_engine == 'mc':
+                d_row['br_leptons_err'] = self._br_leptons_err
+                d_row['br_jets_err'] = self._br_jets_err
+                d_row['br_photons_err'] = self._br_photons_err
+                d_row['br_met_err'] = self._br_met_err
 
         # Plots for signal strength
         if self._calc_mu:
-            plots.mu.append(self._mu)
+            d_row['mu'] = self._mu
 
+        plots.add_point(d_row)
         return plots
 
-    def do_scan(self):  # pylint: disable=too-many-branches,too-many-statements
+    def _get_point(self):
 
-        """ Loops over the different mass combinations and calls appropriate
-        functions to set masses in the SUSYHIT input file and to fill the
-        python dictionary. """
+        """ Get all values of the current point which are filled into the
+        MassScanPlots object. """
+
+        return dict((var, getattr(self, var)) for var in self._l_point_vars)
+
+    def _set_point(self, point):
+
+        """ Set all values of a point, as returned by self._get_point(). """
+
+        for var, value in point.iteritems():
+            setattr(self, var, value)
+
+    def _get_job(self, prmtr_x, prmtr_y,  # pylint: disable=no-self-use
+                 dir_point):
+
+        """ Get job for point (x/y), which is passed through all stages of the
+        scan. dir_point is the directory in which the SUSYHIT output files of
+        this point are processed. """
+
+        return {'prmtr_x': prmtr_x, 'prmtr_y': prmtr_y, 'dir': dir_point,
+                'slha': '{}/susyhit_slha.out'.format(dir_point),
+                'error': False, 'mu': 0.}
+
+    def _stage_susyhit(self, job, dir_susyhit):
+
+        """ Set parameters of point job in the SUSYHIT input file in
+        dir_susyhit, run SUSYHIT there and check its output. The output files
+        are copied to job['dir'], if this is a different directory. """
+
+        LGR.debug('prmtr_x = %4d  -  prmtr_y = %4d', job['prmtr_x'],
+                  job['prmtr_y'])
+
+        text_in = self._set_parameter_all(job['prmtr_x'], job['prmtr_y'],
+                                          dir_susyhit)
+
+        # Run SUSYHIT
+        self._run_susyhit(dir_susyhit, text_in)
+        if dir_susyhit != job['dir']:
+            for s_file in ['susyhit_slha.out', 'suspect2.out']:
+                copyfile(join(dir_susyhit, s_file), join(job['dir'], s_file))
+
+        if not self._check_susyhit_output('{}/suspect2.out'
+                                          .format(job['dir'])):
+            self._skip_point(job)
+        # Check for LSP
+        elif not self._check_lsp(job['slha']):
+            self._skip_point(job)
+
+        return job
+
+    def _stage_xsec(self, job):
+
+        """ Calculate cross sections for point job with xseccomputer, then
+        archive the SUSYHIT output files. The archived cross sections are LO,
+        the k-factors are applied when they are read. """
+
+        if not job['error'] and (self._calc_xs or self._calc_mu):
+            # 8 TeV cross-sections to check if the model is already
+            # excluded and 13 TeV cross-sections for cross-sections
+            # itself
+            self._run_xseccomputer(job['dir'], [8, 13])
+
+        # Move SUSYHIT output
+        system('cp {}/susyhit_slha.out susyhit_slha_{}_{}.out'
+               .format(job['dir'], job['prmtr_x'], job['prmtr_y']))
+        system('cp {}/suspect2.out suspect2_{}_{}.out'
+               .format(job['dir'], job['prmtr_x'], job['prmtr_y']))
+
+        return job
+
+    def _run_xseccomputer(self, dir_point, l_com):
+
+        """ Add cross sections for all center-of-mass energies in l_com to
+        the SUSYHIT output file in directory dir_point. xseccomputer runs for
+        all energies at the same time, each on its own copy of the file. The
+        XSECTION blocks are then added to the file in the order of l_com. """
+
+        filename = '{}/susyhit_slha.out'.format(dir_point)
+        with open(filename, 'r') as f_susyhit:
+            text_base = f_susyhit.read()
+
+        l_filenames = ['{}/susyhit_slha_{}.out'.format(dir_point, com)
+                       for com in l_com]
+        for filename_com in l_filenames:
+            copyfile(filename, filename_com)
+
+        l_cmds = ['runTools xseccomputer -p -s {} -f {}'.format(com,
+                                                                filename_com)
+                  for com, filename_com in zip(l_com, l_filenames)]
+        pool = ThreadPool(len(l_cmds))
+        try:
+            pool.map(lambda cmd: self._run_external('SModelS', cmd), l_cmds)
+        finally:
+            pool.close()
+            pool.join()
+
+        with open(filename, 'w') as f_susyhit:
+            f_susyhit.write(text_base)
+            for filename_com in l_filenames:
+                with open(filename_com, 'r') as f_com:
+                    f_susyhit.write(self._get_xsections_added(text_base,
+                                                              f_com.read()))
+                remove(filename_com)
+
+    def _get_xsections_added(self, text_base,  # pylint: disable=no-self-use
+                             text_com):
+
+        """ Get the text which xseccomputer added to text_base, given the
+        text text_com of the file after xseccomputer has run. """
+
+        # xseccomputer appends its results to the end of the file
+        if text_com.startswith(text_base):
+            return text_com[len(text_base):]
+
+        # Otherwise, take everything from the first XSECTION block on
+        l_lines = text_com.splitlines(True)
+        for idx, line in enumerate(l_lines):
+            if line.upper().startswith('XSECTION'):
+                return ''.join(l_lines[idx:])
+        raise RuntimeError('No cross sections found in xseccomputer output.')
+
+    def _stage_smodels(self, job, smodels_service):
+
+        """ Check with SModelS if point job is already excluded. """
+
+        if not job['error'] and self._calc_mu:
+            job['mu'] = self._run_smodels(job, smodels_service)
+            LGR.debug('Excluded signal strength: %s', job['mu'])
+
+        return job
+
+    def _stage_analysis(self, job):  # pylint: disable=too-many-branches
+
+        """ Calculate all values of point job from the SUSYHIT output file
+        job['slha'] and return the values to be filled into the plots. This
+        stage changes the state of this object, so it can only process one
+        point at a time. """
+
+        # Clear SUSY dictionary (SM can stay) and multiplicities
+        self._d_susy.clear()
+        self._d_mult.clear()
+        self._d_mult_budget.clear()
+        self._d_hash.clear()
+        self._d_br_1leg.clear()
+        self._d_mc_table.clear()
+        self._d_mc_unknown.clear()
+
+        if not job['error']:
+            self._read_slha(job['slha'])
+
+        # Get particle masses
+        if not job['error'] and self._calc_masses:
+            self._get_masses()
+
+        # Get particle lifetimes
+        if not job['error'] and self._calc_br:
+            self._get_ctau()
+
+        # Get cross-sections
+        if not job['error'] and self._calc_xs:
+            self._get_xs()
+
+        self._mu = job['mu']
+
+        # Calculate branching ratios into final states
+        if not job['error'] and self._calc_br:
+            self._get_br_all()
+            if not self._br_leptons or \
+               not self._br_jets or \
+               not self._br_photons:
+                LGR.warning('Some branching ratios are empty.')
+                self._skip_point(job)
+
+
+        # Get decay channels
+        if not job['error'] and self._calc_br:
+            self._dc = np.array(
+                [self._get_dcs(getattr(self, '_id_{}'.format(name)))
+                 .get_array() for name in MassScanPlots.l_dc_names])
+
+        # If there was an error, empty all values
+        if job['error']:
+            self._reset()
+
+        # The SUSYHIT output file may be changed by the next point
+        if self._slha is not None:
+            self._slha.close()
+            self._slha = None
+
+        return self._get_point()
+
+    def _scan_point(self, prmtr_x, prmtr_y):
+
+        """ Run SUSYHIT and all subsequent calculations for point (x/y) in the
+        SUSYHIT installation directory and return the values to be filled into
+        the plots. """
+
+        job = self._get_job(prmtr_x, prmtr_y, self._dir_susyhit)
+        self._stage_susyhit(job, self._dir_susyhit)
+        self._stage_xsec(job)
+        self._stage_smodels(job, self._smodels_service)
+        return self._stage_analysis(job)
+
+    def _scan_serial(self, l_points):
+
+        """ Scan all points (x/y) in l_points one after the other in the
+        SUSYHIT installation directory. Returns a dictionary with the
+        results per point. """
 
         # Make backup SUSYHIT input file
         system('mv {}/{}.in{{,.orig}}'.format(self._dir_susyhit,
                                               self._get_susyhit_filename()))
 
-        # Copy template input file
-        system('cp {}.template {}/{}.in'.format(self._get_susyhit_filename(),
-                                                self._dir_susyhit,
-                                                self._get_susyhit_filename()))
+        d_results = {}
+        for counter, (prmtr_x, prmtr_y) in enumerate(l_points, 1):
+            LGR.info('Processing mass combination %3d of %3d: (%4d/%4d).',
+                     counter, len(l_points), prmtr_x, prmtr_y)
+            d_results[(prmtr_x, prmtr_y)] = self._scan_point(prmtr_x, prmtr_y)
+            self._save_checkpoint(prmtr_x, prmtr_y,
+                                  d_results[(prmtr_x, prmtr_y)])
+
+        # Stop SModelS service (the worker processes of
+        # self._scan_parallel() stop their own when they exit, see
+        # _init_worker())
+        self._smodels_service.stop()
+
+        # Restore backup SUSYHIT input file
+        system('mv {}/{}.in{{.orig,}}'.format(self._dir_susyhit,
+                                              self._get_susyhit_filename()))
+
+        return d_results
+
+    def _scan_parallel(self, l_points, jobs):
+
+        """ Scan all points (x/y) in l_points with a pool of jobs worker
+        processes. Every worker runs SUSYHIT in its own copy of the SUSYHIT
+        installation. Returns a dictionary with the results per point. """
+
+        global _SCAN  # pylint: disable=global-statement
+
+        # All sandboxes are created in one temporary directory, which is
+        # removed once all points are processed
+        dir_sandboxes = mkdtemp(prefix='sandbox_susyhit_', dir=getcwd())
+
+        # The workers inherit this object when they are forked
+        _SCAN = self
+        pool = Pool(jobs, _init_worker, (dir_sandboxes,))
+
+        finished = False
+        try:
+            d_results = {}
+            # Points are returned as soon as they are done, so that they can
+            # be checkpointed immediately
+            for counter, (prmtrs, point) in \
+                    enumerate(pool.imap_unordered(_scan_point_worker,
+                                                  l_points), 1):
+                LGR.info('Finished mass combination %3d of %3d: (%4d/%4d).',
+                         counter, len(l_points), prmtrs[0], prmtrs[1])
+                d_results[prmtrs] = point
+                self._save_checkpoint(prmtrs[0], prmtrs[1], point)
+            finished = True
+        finally:
+            # If all points are done, let the workers exit normally, so that
+            # they stop their SModelS service; if a point failed, kill them
+            if finished:
+                pool.close()
+            else:
+                pool.terminate()
+            pool.join()
+            _SCAN = None
+            rmtree(dir_sandboxes, ignore_errors=True)
+
+        return d_results
+
+    def _scan_pipelined(self, l_points):
+
+        """ Scan all points (x/y) in l_points in a pipeline, in which SUSYHIT,
+        xseccomputer, SModelS and the analysis of the output work on different
+        points at the same time. SUSYHIT runs in private copies of the SUSYHIT
+        installation, every point is processed in its own directory. Returns
+        a dictionary with the results per point. """
+
+        # Sandboxes and point directories are created in one temporary
+        # directory, which is removed once all points are processed
+        dir_tmp = mkdtemp(prefix='pipeline_susyhit_', dir=getcwd())
+
+        # Every SUSYHIT and SModelS slot takes a sandbox or service from the
+        # queue and puts it back when it is done
+        q_sandboxes = Queue()
+        for idx in range(self._d_stage_concurrency['susyhit']):
+            dir_sandbox = join(dir_tmp, 'sandbox_{}'.format(idx))
+            self._make_sandbox(dir_sandbox)
+            q_sandboxes.put(dir_sandbox)
+        filename_parameters = self._smodels_parameters
+        l_services = [SModelSService(filename_parameters=filename_parameters)
+                      for _ in range(self._d_stage_concurrency['smodels'])]
+        q_services = Queue()
+        for smodels_service in l_services:
+            q_services.put(smodels_service)
+
+        def stage_susyhit(prmtrs):
+            """ Run SUSYHIT for point prmtrs = (x, y) in a free sandbox. """
+            job = self._get_job(prmtrs[0], prmtrs[1],
+                                join(dir_tmp, 'point_{}_{}'.format(*prmtrs)))
+            makedirs(job['dir'])
+            dir_sandbox = q_sandboxes.get()
+            try:
+                return self._stage_susyhit(job, dir_sandbox)
+            finally:
+                q_sandboxes.put(dir_sandbox)
+
+        def stage_smodels(job):
+            """ Run SModelS for point job with a free service. """
+            smodels_service = q_services.get()
+            try:
+                return self._stage_smodels(job, smodels_service)
+            finally:
+                q_services.put(smodels_service)
+
+        def stage_analysis(job):
+            """ Analyse point job and remove its directory. """
+            point = self._stage_analysis(job)
+            rmtree(job['dir'], ignore_errors=True)
+            return (job['prmtr_x'], job['prmtr_y']), point
+
+        pipeline = Pipeline()
+        pipeline.add_stage('SUSYHIT', stage_susyhit,
+                           self._d_stage_concurrency['susyhit'])
+        pipeline.add_stage('xseccomputer', self._stage_xsec,
+                           self._d_stage_concurrency['xsec'])
+        pipeline.add_stage('SModelS', stage_smodels,
+                           self._d_stage_concurrency['smodels'])
+        # The analysis changes the state of this object, it must never run
+        # for two points at the same time
+        pipeline.add_stage('analysis', stage_analysis, 1)
+
+        try:
+            d_results = {}
+            for counter, (prmtrs, point) in enumerate(pipeline.run(l_points),
+                                                      1):
+                LGR.info('Finished mass combination %3d of %3d: (%4d/%4d).',
+                         counter, len(l_points), prmtrs[0], prmtrs[1])
+                d_results[prmtrs] = point
+                self._save_checkpoint(prmtrs[0], prmtrs[1], point)
+        finally:
+            for smodels_service in l_services:
+                smodels_service.stop()
+            rmtree(dir_tmp, ignore_errors=True)
+
+        return d_results
+
+    def set_stage_concurrency(self, stage, concurrency):
+
+        """ Set maximum number of points processed at the same time in stage
+        ('susyhit', 'xsec' or 'smodels') of the pipelined scan. Every SUSYHIT
+        slot uses its own copy of the SUSYHIT installation and every SModelS
+        slot its own SModelS service. """
+
+        if stage not in self._d_stage_concurrency:
+            raise ValueError('Unknown stage {}, has to be one of {}.'
+                             .format(stage,
+                                     sorted(self._d_stage_concurrency)))
+
+        self._d_stage_concurrency[stage] = concurrency
+
+    def _get_checkpoint_filename(self, prmtr_x, prmtr_y):
+
+        """ Get filename of the checkpoint for point (x/y). """
+
+        return '{}/point_{}_{}.pkl'.format(self._dir_checkpoint,
+                                           prmtr_x, prmtr_y)
+
+    def _save_checkpoint(self, prmtr_x, prmtr_y, point):
+
+        """ Store results of point (x/y) in the checkpoint directory. """
+
+        if self._dir_checkpoint is None:
+            return
+
+        # Write to temporary file first, so that an interrupted write never
+        # leaves a corrupt checkpoint behind
+        filename = self._get_checkpoint_filename(prmtr_x, prmtr_y)
+        with open('{}.tmp'.format(filename), 'wb') as f_checkpoint:
+            dump({'coordinate_x': prmtr_x, 'coordinate_y': prmtr_y,
+                  'point': point}, f_checkpoint, HIGHEST_PROTOCOL)
+        rename('{}.tmp'.format(filename), filename)
+
+    def _load_checkpoint(self, prmtr_x, prmtr_y):
+
+        """ Load results of point (x/y) from the checkpoint directory. Returns
+        None if the point has not been checkpointed yet or its checkpoint is
+        damaged. """
+
+        if self._dir_checkpoint is None:
+            return None
+
+        try:
+            with open(self._get_checkpoint_filename(prmtr_x, prmtr_y),
+                      'rb') as f_checkpoint:
+                return load(f_checkpoint)['point']
+        except IOError:
+            return None
+        except (EOFError, UnpicklingError):
+            # Truncated checkpoint, e.g. the scan was killed while writing it
+            LGR.warning('Checkpoint of point (%s/%s) is damaged, recalculate '
+                        'the point.', prmtr_x, prmtr_y)
+            return None
+
+    def set_checkpoint(self, dir_checkpoint):
+
+        """ Set directory in which the results of every point are stored as
+        soon as the point is done. Points which are found in this directory
+        are not recalculated, so an interrupted scan can be resumed. The
+        directory should not be shared between scans with different
+        settings. """
+
+        system('mkdir -p {}'.format(dir_checkpoint))
+        self._dir_checkpoint = dir_checkpoint
+
+    def _make_sandbox(self, dir_sandbox):
+
+        """ Create a private copy of the SUSYHIT installation in dir_sandbox.
+        Executables are hardlinked, all other files are copied, since SUSYHIT
+        might overwrite them in place. """
+
+        for dir_src, _, l_files in walk(self._dir_susyhit):
+            dir_dst = normpath(join(dir_sandbox,
+                                    relpath(dir_src, self._dir_susyhit)))
+            makedirs(dir_dst)
+            for s_file in l_files:
+                f_src = join(dir_src, s_file)
+                f_dst = join(dir_dst, s_file)
+                if access(f_src, X_OK):
+                    try:
+                        link(f_src, f_dst)
+                        continue
+                    except OSError:
+                        # E.g. sandbox on a different filesystem
+                        pass
+                copy2(f_src, f_dst)
+
+        LGR.debug('Created SUSYHIT sandbox in %s.', dir_sandbox)
+
+    def do_scan(self, jobs=1, pipelined=False):
+
+        """ Loops over the different mass combinations and calls appropriate
+        functions to set masses in the SUSYHIT input file and to fill the
+        python dictionary. With jobs > 1, the mass combinations are
+        distributed over jobs worker processes. With pipelined, the different
+        stages of the calculation work on different mass combinations at the
+        same time, see self.set_stage_concurrency(). """
+
+        if jobs > 1 and pipelined:
+            raise ValueError('Scan can either run in worker processes or '
+                             'pipelined, not both.')
+
+        # Fill SM dictionary
+        self._fill_dict_sm()
+
+        # Read SUSYHIT input template, the input file of every point is
+        # rendered from it
+        self._slha_template = SlhaTemplate('{}.template'.format(
+            self._get_susyhit_filename()))
+
+        # All mass combinations, in the order in which they are plotted
+        l_points = list(product(self.l_prmtr_x, self.l_prmtr_y))
+
+        # Skip points which are already done from a previous run
+        d_results = {}
+        for prmtr_x, prmtr_y in l_points:
+            point = self._load_checkpoint(prmtr_x, prmtr_y)
+            if point is not None:
+                d_results[(prmtr_x, prmtr_y)] = point
+        if d_results:
+            LGR.info('Resume scan, %d of %d mass combinations are already '
+                     'done.', len(d_results), len(l_points))
+        l_todo = [prmtrs for prmtrs in l_points if prmtrs not in d_results]
+
+        if l_todo and pipelined:
+            d_results.update(self._scan_pipelined(l_todo))
+        elif l_todo and jobs > 1:
+            d_results.update(self._scan_parallel(l_todo, jobs))
+        elif l_todo:
+            d_results.update(self._scan_serial(l_todo))
+
+        self._mult_cache.save()
+
+        return self._get_plots(l_points, d_results)
+
+    def reprocess(self, directory, jobs=1):
+
+        """ Make the plots from the SUSYHIT output files which a previous scan
+        has left in directory (susyhit_slha_X_Y.out, suspect2_X_Y.out and, if
+        the signal strength is calculated, smodels_summary_X_Y.txt), without
+        running SUSYHIT, xseccomputer or SModelS again. All mass combinations
+        which are found are used, self.l_prmtr_x and self.l_prmtr_y are
+        ignored. The parameters (self.set_parameter() etc.) should be the same
+        as in the original scan, they are only used for the axis labels. The
+        cross sections in the files are LO, the k-factors of this object (see
+        self.set_k_factors()) are applied, so they can differ from the
+        original scan. With jobs > 1, the mass combinations are distributed
+        over jobs worker processes. """
+
+        global _SCAN  # pylint: disable=global-statement
 
         # Fill SM dictionary
         self._fill_dict_sm()
 
-        # # Calculate total number of different mass combinations
-        # total = len(M_GLUINOS) * len(M_CHARGINOS1) * len(M_NEUTRALINOS1)
-        total = len(self.l_prmtr_x) * len(self.l_prmtr_y)
+        d_jobs = {}
+        for filename in listdir(directory):
+            file_match = match(r'susyhit_slha_([^_]+)_([^_]+)\.out$', filename)
+            if not file_match:
+                continue
+            try:
+                prmtrs = tuple(self._get_coordinate(file_match.group(idx))
+                               for idx in [1, 2])
+            except ValueError:
+                continue
+            job = self._get_job(prmtrs[0], prmtrs[1], directory)
+            job['slha'] = join(directory, filename)
+            d_jobs[prmtrs] = job
+
+        if not d_jobs:
+            raise RuntimeError('No SUSYHIT output files found in {}.'
+                               .format(directory))
+
+        # Plot in the same order as self.do_scan()
+        l_points = sorted(d_jobs)
+        LGR.info('Reprocess %d mass combinations from %s.', len(l_points),
+                 directory)
+
+        d_results = {}
+        if jobs > 1:
+            # The workers inherit this object when they are forked
+            _SCAN = self
+            pool = Pool(jobs)
+            finished = False
+            try:
+                for prmtrs, point in pool.imap_unordered(
+                        _reprocess_point_worker,
+                        [d_jobs[prmtrs] for prmtrs in l_points]):
+                    d_results[prmtrs] = point
+                finished = True
+            finally:
+                # Only kill the workers if a point failed
+                if finished:
+                    pool.close()
+                else:
+                    pool.terminate()
+                pool.join()
+                _SCAN = None
+        else:
+            for prmtrs in l_points:
+                d_results[prmtrs] = self._reprocess_point(d_jobs[prmtrs])
+
+        self._mult_cache.save()
+
+        return self._get_plots(l_points, d_results)
+
+    def _get_coordinate(self, text):  # pylint: disable=no-self-use
+
+        """ Get coordinate from its text in a filename, as int if possible
+        and as float otherwise. """
+
+        try:
+            return int(text)
+        except ValueError:
+            return float(text)
+
+    def _reprocess_point(self, job):
+
+        """ Calculate all values of point job from its archived output files
+        and return the values to be filled into the plots. """
+
+        LGR.debug('Reprocess point (%4d/%4d).', job['prmtr_x'],
+                  job['prmtr_y'])
 
-        # Define counter to count from 1 to total
-        counter = 0
+        if not self._check_susyhit_output('{}/suspect2_{}_{}.out'
+                                          .format(job['dir'], job['prmtr_x'],
+                                                  job['prmtr_y'])):
+            self._skip_point(job)
+        elif not self._check_lsp(job['slha']):
+            self._skip_point(job)
+        elif self._calc_mu:
+            job['mu'] = self._get_mu('{}/smodels_summary_{}_{}.txt'
+                                     .format(job['dir'], job['prmtr_x'],
+                                             job['prmtr_y']))
+
+        return self._stage_analysis(job)
+
+    def _get_plots(self, l_points, d_results):
+
+        """ Create MassScanPlots object and fill it with the results in
+        d_results of all points (x/y) in l_points. """
 
         # Create MassScanPlots object for plotting
         plots = MassScanPlots()
@@ -1075,118 +2273,51 @@ class MassScan(PdgParticle):
         plots.set_text(self._prmtr_id_y, self._d_prmtr_y_add,
                        self._d_prmtr_y_scale)
 
-        for prmtr_x in self.l_prmtr_x:
-            for prmtr_y in self.l_prmtr_y:
-
-                # Clear SUSY dictionary (SM can stay)
-                self._d_susy.clear()
-
-                counter += 1
-
-                # Reset error
-                self._error = False
-
-                LGR.info('Processing mass combination %3d of %3d: (%4d/%4d).',
-                         counter, total, prmtr_x, prmtr_y)
-
-                LGR.debug('prmtr_x = %4d  -  prmtr_y = %4d', prmtr_x, prmtr_y)
-
-                self._set_parameter_all(prmtr_x, prmtr_y)
-
-                # Run SUSYHIT
-                self._run_external('SUSYHIT', 'cd {} && ./run'
-                                   .format(self._dir_susyhit))
-                if not self._check_susyhit_output():
-                    self._skip_point(prmtr_x, prmtr_y)
-
-                # Check for LSP
-                if not self._error and not self._check_lsp():
-                    self._skip_point(prmtr_x, prmtr_y)
-
-                # Get particle masses
-                if not self._error and self._calc_masses:
-                    self._get_masses()
-
-                # Get particle lifetimes
-                if not self._error and self._calc_br:
-                    self._get_ctau()
-
-                # Calculate cross-section with SModelS
-                if not self._error and (self._calc_xs or self._calc_mu):
-                    # 8 TeV cross-sections to check if the model is already
-                    # excluded and 13 TeV cross-sections for cross-sections
-                    # itself
-                    for com in [8, 13]:
-                        self._run_external('SModelS', 'runTools xseccomputer '
-                                           '-p -s {} -f {}/susyhit_slha.out'
-                                           .format(com, self._dir_susyhit))
-
-                    # Apply k-factors
-                    self._apply_k_factor()
-
-                    if self._calc_xs:
-                        self._get_xs()
-
-
-                # Move SUSYHIT output
-                system('cp {}/susyhit_slha.out susyhit_slha_{}_{}.out'
-                       .format(self._dir_susyhit, prmtr_x, prmtr_y))
-                system('cp {}/suspect2.out suspect2_{}_{}.out'
-                       .format(self._dir_susyhit, prmtr_x, prmtr_y))
-
-                # Check if models are already excluded
-                if not self._error and self._calc_mu:
-                    self._run_external('SModelS', 'timeout 1800 runSModelS '
-                                       '-o smodels_summary.txt '
-                                       '-f {}/susyhit_slha.out'
-                                       .format(self._dir_susyhit), False)
-                    self._mu = self._get_mu()
-
-                    # Move SModelS output file
-                    system('mv smodels_summary.txt smodels_summary_{}_{}.txt '
-                           '2>/dev/null'.format(prmtr_x, prmtr_y))
-
-                    LGR.debug('Excluded signal strength: %s', self._mu)
-
-                # Calculate branching ratios into final states
-                if not self._error and self._calc_br:
-                    self._get_br_all()
-                    if not self._br_leptons or \
-                       not self._br_jets or \
-                       not self._br_photons:
-                        LGR.warning('Some branching ratios are empty.')
-                        self._skip_point(prmtr_x, prmtr_y)
-
-
-                # Get decay channels
-                if not self._error and self._calc_br:
-                    self._dc_gluino = self._get_dcs(self._id_gluino)
-                    self._dc_chargino1 = self._get_dcs(self._id_chargino1)
-                    self._dc_chargino2 = self._get_dcs(self._id_chargino2)
-                    self._dc_neutralino2 = self._get_dcs(self._id_neutralino2)
-                    self._dc_neutralino3 = self._get_dcs(self._id_neutralino3)
-                    self._dc_neutralino4 = self._get_dcs(self._id_neutralino4)
-                    self._dc_sdown_l = self._get_dcs(self._id_sdown_l)
-                    self._dc_sdown_r = self._get_dcs(self._id_sdown_r)
-                    self._dc_sup_l = self._get_dcs(self._id_sup_l)
-                    self._dc_sup_r = self._get_dcs(self._id_sup_r)
-                    self._dc_sstrange_l = self._get_dcs(self._id_sstrange_l)
-                    self._dc_sstrange_r = self._get_dcs(self._id_sstrange_r)
-                    self._dc_scharm_l = self._get_dcs(self._id_scharm_l)
-                    self._dc_scharm_r = self._get_dcs(self._id_scharm_r)
-
-                # If there was an error, empty all values
-                if self._error:
-                    self._reset()
-
-                plots = self._fill_plots(plots, prmtr_x, prmtr_y)
+        # Additional thresholds for the branching ratios
+        if self._br_engine == 'exact':
+            plots.set_thresholds(self._l_thresholds)
 
-        # Restore backup SUSYHIT input file
-        system('mv {}/{}.in{{.orig,}}'.format(self._dir_susyhit,
-                                              self._get_susyhit_filename()))
+        for prmtr_x, prmtr_y in l_points:
+            self._set_point(d_results[(prmtr_x, prmtr_y)])
+            plots = self._fill_plots(plots, prmtr_x, prmtr_y)
 
         # Throw error when no list is filled
         if len(plots.coordinate_x) == 0:
             raise RuntimeError('Nothing to plot.')
 
         return plots
+
+
+# MassScan object used by the worker processes of MassScan._scan_parallel()
+# and MassScan.reprocess()
+_SCAN = None
+
+
+def _init_worker(dir_sandboxes):
+
+    """ Initialize worker process with its own SUSYHIT sandbox. """
+
+    # pylint: disable=protected-access
+    dir_sandbox = join(dir_sandboxes, str(getpid()))
+    _SCAN._make_sandbox(dir_sandbox)
+    _SCAN._dir_susyhit = dir_sandbox
+
+    # Stop the SModelS service of this worker when it exits; this only
+    # happens if the pool is closed, not if it is terminated
+    Finalize(_SCAN, _SCAN._smodels_service.stop, exitpriority=10)
+
+
+def _scan_point_worker(prmtrs):
+
+    """ Scan point prmtrs = (x, y) in worker process. """
+
+    # pylint: disable=protected-access
+    return prmtrs, _SCAN._scan_point(*prmtrs)
+
+
+def _reprocess_point_worker(job):
+
+    """ Reprocess point job in worker process. """
+
+    # pylint: disable=protected-access
+    return (job['prmtr_x'], job['prmtr_y']), _SCAN._reprocess_point(job)
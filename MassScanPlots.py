@@ -3,88 +3,98 @@
 """ Plotting class for mass scan. """
 
 from os import system
-from ROOT import TFile, gStyle  # pylint: disable=import-error
+import numpy as np
 from Logger import LGR
-from ToolboxTH2 import ToolboxTH2
-from ToolboxHelper import safe_divide
+from DecayChannel import DecayChannel
+from ResultStore import ResultStore
+from DerivedObservables import DerivedObservables
+from ToolboxHelper import get_lst_entry_default
 
 
 class MassScanPlots(object):
 
     """ Plotting class for mass scan. """
 
+    # Particles for which the decay channels are plotted
+    l_dc_names = ['gluino', 'chargino1', 'chargino2', 'neutralino2',
+                  'neutralino3', 'neutralino4', 'sdown_l', 'sdown_r', 'sup_l',
+                  'sup_r', 'sstrange_l', 'sstrange_r', 'scharm_l', 'scharm_r']
+
+    # Columns of the results, one row per point, see ResultStore; the
+    # columns can be read as attributes, see self.__getattr__()
+    _l_schema = ([('coordinate_x', float, ()), ('coordinate_y', float, ())] +
+                 # Masses
+                 [('m_{}'.format(name), float, ()) for name in
+                  ['gluino', 'neutralino1', 'neutralino2', 'neutralino3',
+                   'neutralino4', 'chargino1', 'chargino2', 'stop1', 'stop2',
+                   'smhiggs', 'sdown_l', 'sdown_r', 'sup_l', 'sup_r',
+                   'sstrange_l', 'sstrange_r', 'scharm_l', 'scharm_r']] +
+                 # Lifetimes
+                 [('ct_{}'.format(name), float, ()) for name in
+                  ['gluino', 'chargino1', 'neutralino2']] +
+                 # xs's and dominant production particle id
+                 [(name, float, ()) for name in
+                  ['xs13_incl', 'xs13_strong', 'xs13_gluinos', 'xs8_incl',
+                   'xs8_strong']] +
+                 [('dom_id1', int, ()), ('dom_id2', int, ())] +
+                 # Branching ratios per number of particles, the
+                 # statistical uncertainties are only filled for the Monte
+                 # Carlo calculation
+                 [('br_{}{}'.format(particles, suffix), float, (no_max,))
+                  for suffix in ['', '_err'] for particles, no_max in
+                  [('leptons', 5), ('jets', 13), ('photons', 4), ('met', 5)]] +
+                 # Joint distributions of the number of leptons, jets,
+                 # photons and invisible particles, [n_leptons, n_jets,
+                 # n_photons, n_met], where the last entry of every axis
+                 # holds all higher multiplicities, and upper bound on the
+                 # probability discarded in the branching ratios (only filled
+                 # if a precision is set)
+                 [('br_joint', float, (5, 13, 4, 5)),
+                  ('br_error', float, ())] +
+                 # Decay channels per particle (see l_dc_names and
+                 # DecayChannel.get_array())
+                 [('dc', DecayChannel.dtype,
+                   (14, DecayChannel.no_channels_max))] +
+                 # Signal strength
+                 [('mu', float, ())])
+
+    # Observables derived from the columns, see DerivedObservables, as
+    # (name, operation, operand1, operand2, ...)
+    _l_derived = ([('m_{}-m_{}'.format(name1, name2), 'difference',
+                    'm_{}'.format(name1), 'm_{}'.format(name2))
+                   for name1, name2 in
+                   [('gluino', 'chargino1'), ('chargino1', 'neutralino1'),
+                    ('neutralino3', 'neutralino1'),
+                    ('neutralino3', 'neutralino2'),
+                    ('neutralino2', 'neutralino1'),
+                    ('neutralino3', 'chargino1'),
+                    ('neutralino2', 'chargino1')]] +
+                  [('xs13_xs8', 'ratio', 'xs13_incl', 'xs8_incl')] +
+                  # Branching ratios into at least n particles
+                  [('br_{}_incl'.format(particles), 'inclusive',
+                    'br_{}'.format(particles)) for particles in
+                   ['leptons', 'jets', 'photons', 'met']] +
+                  [('xs13_x_br_leptons', 'product', 'br_leptons',
+                    'xs13_incl')])
+
     def __init__(self):
 
         """ Initialize object variables. """
 
-        # X/Y coordinates for plotting
-        self.coordinate_x = []
-        self.coordinate_y = []
-
         # Axes labels
         self._axis_x = 'M_{3} [GeV]'
         self._axis_y = '#mu [GeV]'
 
-        # Branching ratios
-        self.br_leptons = [[], [], [], [], []]
-        self.br_jets = [[], [], [], [], [], [], [], [], [], [], [], [], []]
-        self.br_photons = [[], [], [], []]
-        self.br_met = [[], [], [], [], []]
-
-        # xs's
-        self.xs13_incl = []
-        self.xs13_strong = []
-        self.xs13_gluinos = []
-        self.xs8_incl = []
-        self.xs8_strong = []
-
-        # Dominant production particle id
-        self.dom_id1 = []
-        self.dom_id2 = []
+        # Results of all points
+        self._store = ResultStore(self._l_schema)
 
-        # Masses
-        self.m_gluino = []
-        self.m_neutralino1 = []
-        self.m_neutralino2 = []
-        self.m_neutralino3 = []
-        self.m_neutralino4 = []
-        self.m_chargino1 = []
-        self.m_chargino2 = []
-        self.m_stop1 = []
-        self.m_stop2 = []
-        self.m_smhiggs = []
-        self.m_sdown_l = []
-        self.m_sdown_r = []
-        self.m_sup_l = []
-        self.m_sup_r = []
-        self.m_sstrange_l = []
-        self.m_sstrange_r = []
-        self.m_scharm_l = []
-        self.m_scharm_r = []
+        # Observables derived from the results, evaluated when plotted
+        self._derived = DerivedObservables(self._store)
+        for derived in self._l_derived:
+            self._derived.add(*derived)
 
-        # Lifetimes
-        self.ct_gluino = []
-        self.ct_chargino1 = []
-        self.ct_neutralino2 = []
-
-        # Decay channels
-        self.dc_gluino = []
-        self.dc_chargino1 = []
-        self.dc_chargino2 = []
-        self.dc_neutralino2 = []
-        self.dc_neutralino3 = []
-        self.dc_neutralino4 = []
-        self.dc_sdown_l = []
-        self.dc_sdown_r = []
-        self.dc_sup_l = []
-        self.dc_sup_r = []
-        self.dc_sstrange_l = []
-        self.dc_sstrange_r = []
-        self.dc_scharm_l = []
-        self.dc_scharm_r = []
-
-        # Signal strength
-        self.mu = []  # pylint: disable=invalid-name
+        # Branching ratios for additional thresholds, see set_thresholds()
+        self.thresholds = []
 
         # Star to be plotted on all TH2's
         self._star = [0, 0]
@@ -92,12 +102,26 @@ class MassScanPlots(object):
         # Text which explains parameter values
         self._text = []
 
-        self._toolbox = ToolboxTH2()
+        # Toolbox for plotting, ROOT is only loaded when it is needed, see
+        # self._load_toolbox()
+        self._toolbox = None
+
+    def _load_toolbox(self):
+
+        """ Load ROOT and the toolbox for plotting, if not done already. """
+
+        if self._toolbox is None:
+            from ToolboxTH2 import ToolboxTH2
+            self._toolbox = ToolboxTH2()
 
     def plot(self):
 
         """ ROOT plotting. """
 
+        from ROOT import gStyle  # pylint: disable=import-error
+
+        self._load_toolbox()
+
         # Masses
         name = 'm_gluino'
         title = 'm_{#tilde{g}} [GeV]'
@@ -191,44 +215,31 @@ class MassScanPlots(object):
         # Mass differences
         name = 'm_gluino-m_chargino1'
         title = 'm_{#tilde{g}} - m_{#chi_{1}^{#pm}} [GeV]'
-        self._make_plot(name, title, [a-b for a, b in
-                                      zip(self.m_gluino, self.m_chargino1)])
+        self._make_plot(name, title, self._derived.get(name))
 
         name = 'm_chargino1-m_neutralino1'
         title = 'm_{#chi_{1}^{#pm}} - m_{#chi_{1}^{0}} [GeV]'
-        self._make_plot(name, title, [a-b for a, b in
-                                      zip(self.m_chargino1,
-                                          self.m_neutralino1)])
+        self._make_plot(name, title, self._derived.get(name))
 
         name = 'm_neutralino3-m_neutralino1'
         title = 'm_{#chi_{3}^{0}} - m_{#chi_{1}^{0}} [GeV]'
-        self._make_plot(name, title, [a-b for a, b in
-                                      zip(self.m_neutralino3,
-                                          self.m_neutralino1)])
+        self._make_plot(name, title, self._derived.get(name))
 
         name = 'm_neutralino3-m_neutralino2'
         title = 'm_{#chi_{3}^{0}} - m_{#chi_{2}^{0}} [GeV]'
-        self._make_plot(name, title, [a-b for a, b in
-                                      zip(self.m_neutralino3,
-                                          self.m_neutralino2)])
+        self._make_plot(name, title, self._derived.get(name))
 
         name = 'm_neutralino2-m_neutralino1'
         title = 'm_{#chi_{2}^{0}} - m_{#chi_{1}^{0}} [GeV]'
-        self._make_plot(name, title, [a-b for a, b in
-                                      zip(self.m_neutralino2,
-                                          self.m_neutralino1)])
+        self._make_plot(name, title, self._derived.get(name))
 
         name = 'm_neutralino3-m_chargino1'
         title = 'm_{#chi_{3}^{0}} - m_{#chi_{1}^{#pm}} [GeV]'
-        self._make_plot(name, title, [a-b for a, b in
-                                      zip(self.m_neutralino3,
-                                          self.m_chargino1)])
+        self._make_plot(name, title, self._derived.get(name))
 
         name = 'm_neutralino2-m_chargino1'
         title = 'm_{#chi_{2}^{0}} - m_{#chi_{1}^{#pm}} [GeV]'
-        self._make_plot(name, title, [a-b for a, b in
-                                      zip(self.m_neutralino2,
-                                          self.m_chargino1)])
+        self._make_plot(name, title, self._derived.get(name))
 
         # Cross-sections
         name = 'xs13_incl'
@@ -254,8 +265,7 @@ class MassScanPlots(object):
 
         name = 'xs13_xs8'
         title = '#sigma_{incl} (13 TeV)/#sigma_{incl} (8 TeV)'
-        self._make_plot(name, title, [safe_divide(a, b) for a, b in
-                                      zip(self.xs13_incl, self.xs8_incl)])
+        self._make_plot(name, title, self._derived.get(name))
 
         # Dominant cross section particles
         gStyle.SetPaintTextFormat('7.0f')
@@ -273,59 +283,59 @@ class MassScanPlots(object):
         # Decay channels
         name = 'dc_gluino'
         title = 'Relative decay channels of #tilde{g}'
-        self._make_plot_dc(name, title, self.dc_gluino)
+        self._make_plot_dc(name, title, self.get_dcs('gluino'))
 
         name = 'dc_chargino1'
         title = 'Relative decay channels of #tilde{#chi}_{1}^{#pm}'
-        self._make_plot_dc(name, title, self.dc_chargino1)
+        self._make_plot_dc(name, title, self.get_dcs('chargino1'))
 
         name = 'dc_chargino2'
         title = 'Relative decay channels of #tilde{#chi}_{2}^{#pm}'
-        self._make_plot_dc(name, title, self.dc_chargino2)
+        self._make_plot_dc(name, title, self.get_dcs('chargino2'))
 
         name = 'dc_neutralino2'
         title = 'Relative decay channels of #tilde{#chi}_{2}^{0}'
-        self._make_plot_dc(name, title, self.dc_neutralino2)
+        self._make_plot_dc(name, title, self.get_dcs('neutralino2'))
 
         name = 'dc_neutralino3'
         title = 'Relative decay channels of #tilde{#chi}_{3}^{0}'
-        self._make_plot_dc(name, title, self.dc_neutralino3)
+        self._make_plot_dc(name, title, self.get_dcs('neutralino3'))
 
         name = 'dc_neutralino4'
         title = 'Relative decay channels of #tilde{#chi}_{4}^{0}'
-        self._make_plot_dc(name, title, self.dc_neutralino4)
+        self._make_plot_dc(name, title, self.get_dcs('neutralino4'))
 
         name = 'dc_sdown_l'
         title = 'Relative decay channels of #tilde{d}_{L}'
-        self._make_plot_dc(name, title, self.dc_sdown_l)
+        self._make_plot_dc(name, title, self.get_dcs('sdown_l'))
 
         name = 'dc_sdown_r'
         title = 'Relative decay channels of #tilde{d}_{R}'
-        self._make_plot_dc(name, title, self.dc_sdown_r)
+        self._make_plot_dc(name, title, self.get_dcs('sdown_r'))
 
         name = 'dc_sup_l'
         title = 'Relative decay channels of #tilde{u}_{L}'
-        self._make_plot_dc(name, title, self.dc_sup_l)
+        self._make_plot_dc(name, title, self.get_dcs('sup_l'))
 
         name = 'dc_sup_r'
         title = 'Relative decay channels of #tilde{u}_{R}'
-        self._make_plot_dc(name, title, self.dc_sup_r)
+        self._make_plot_dc(name, title, self.get_dcs('sup_r'))
 
         name = 'dc_sstrange_l'
         title = 'Relative decay channels of #tilde{s}_{L}'
-        self._make_plot_dc(name, title, self.dc_sstrange_l)
+        self._make_plot_dc(name, title, self.get_dcs('sstrange_l'))
 
         name = 'dc_sstrange_r'
         title = 'Relative decay channels of #tilde{s}_{R}'
-        self._make_plot_dc(name, title, self.dc_sstrange_r)
+        self._make_plot_dc(name, title, self.get_dcs('sstrange_r'))
 
         name = 'dc_scharm_l'
         title = 'Relative decay channels of #tilde{c}_{L}'
-        self._make_plot_dc(name, title, self.dc_scharm_l)
+        self._make_plot_dc(name, title, self.get_dcs('scharm_l'))
 
         name = 'dc_scharm_r'
         title = 'Relative decay channels of #tilde{c}_{R}'
-        self._make_plot_dc(name, title, self.dc_scharm_r)
+        self._make_plot_dc(name, title, self.get_dcs('scharm_r'))
 
         # Branching ratios
         for no_leptons in range(len(self.br_leptons)):
@@ -333,45 +343,82 @@ class MassScanPlots(object):
             title = 'BR into {} leptons'.format(no_leptons)
             self._make_plot(name, title, self.br_leptons[no_leptons], True)
 
+        brs_incl = self._derived.get('br_leptons_incl')
         for no_leptons in range(len(self.br_leptons)):
             name = 'br_{}_leptons_incl'.format(no_leptons)
             title = 'BR into {}+ leptons'.format(no_leptons)
-            self._make_plot(name, title, [sum(i) for i in
-                                          zip(*self.br_leptons[no_leptons:])],
-                            True)
+            self._make_plot(name, title, brs_incl[no_leptons], True)
 
         for no_jets in range(len(self.br_jets)):
             name = 'br_{}_jets'.format(no_jets)
             title = 'BR into {} jets'.format(no_jets)
             self._make_plot(name, title, self.br_jets[no_jets], True)
 
+        brs_incl = self._derived.get('br_jets_incl')
         for no_jets in range(len(self.br_jets)):
             name = 'br_{}_jets_incl'.format(no_jets)
             title = 'BR into {}+ jets'.format(no_jets)
-            self._make_plot(name, title, [sum(i) for i in
-                                          zip(*self.br_jets[no_jets:])],
-                            True)
+            self._make_plot(name, title, brs_incl[no_jets], True)
 
         for no_photons in range(len(self.br_photons)):
             name = 'br_{}_photons'.format(no_photons)
             title = 'BR into {} photons'.format(no_photons)
             self._make_plot(name, title, self.br_photons[no_photons], True)
 
+        brs_incl = self._derived.get('br_photons_incl')
         for no_photons in range(len(self.br_photons)):
             name = 'br_{}_photons_incl'.format(no_photons)
             title = 'BR into {}+ photons'.format(no_photons)
-            self._make_plot(name, title, [sum(i) for i in
-                                          zip(*self.br_photons[no_photons:])],
-                            True)
+            self._make_plot(name, title, brs_incl[no_photons], True)
+
+        for no_met in range(len(self.br_met)):
+            name = 'br_{}_met'.format(no_met)
+            title = 'BR into {} invisible particles'.format(no_met)
+            self._make_plot(name, title, self.br_met[no_met], True)
+
+        brs_incl = self._derived.get('br_met_incl')
+        for no_met in range(len(self.br_met)):
+            name = 'br_{}_met_incl'.format(no_met)
+            title = 'BR into {}+ invisible particles'.format(no_met)
+            self._make_plot(name, title, brs_incl[no_met], True)
+
+        # Branching ratios for additional thresholds
+        for idx, threshold in enumerate(self.thresholds):
+            for particles, text in [('leptons', 'leptons'), ('jets', 'jets'),
+                                    ('photons', 'photons'),
+                                    ('met', 'invisible particles')]:
+                brs = getattr(self, 'br_{}_thr'.format(particles))[idx]
+                for no_particles, br_particles in enumerate(brs):
+                    name = 'br_{}_{}_thr{:g}'.format(no_particles, particles,
+                                                     threshold)
+                    title = 'BR into {} {} (threshold {:g})' \
+                            .format(no_particles, text, threshold)
+                    self._make_plot(name, title, br_particles, True)
+
+        # Only plotted if a precision is set, otherwise the column is empty
+        name = 'br_error'
+        title = 'Upper bound on discarded BR'
+        self._make_plot(name, title, self.br_error, True)
+
+        # Statistical uncertainties of branching ratios
+        for particles, text, brs_err in \
+                [('leptons', 'leptons', self.br_leptons_err),
+                 ('jets', 'jets', self.br_jets_err),
+                 ('photons', 'photons', self.br_photons_err),
+                 ('met', 'invisible particles', self.br_met_err)]:
+            for no_particles, br_err in enumerate(brs_err):
+                name = 'br_{}_{}_err'.format(no_particles, particles)
+                title = 'Uncertainty of BR into {} {}'.format(no_particles,
+                                                              text)
+                self._make_plot(name, title, br_err, True)
 
         # Cross-sections times branching ratio
+        xs_x_brs = self._derived.get('xs13_x_br_leptons')
         for no_leptons in range(len(self.br_leptons)):
             name = 'xs13_x_br_{}_leptons'.format(no_leptons)
             title = '#sigma #times BR(#tilde{{g}}#tilde{{g}} #rightarrow {} ' \
                     'leptons) [fb]'.format(no_leptons)
-            self._make_plot(name, title,
-                            [a*b for a, b in
-                             zip(self.br_leptons[no_leptons], self.xs13_incl)])
+            self._make_plot(name, title, xs_x_brs[no_leptons])
 
         # Signal strength
         name = 'mu'
@@ -391,6 +438,45 @@ class MassScanPlots(object):
         system('mv smodels_summary_*.txt {} 2>/dev/null'
                .format(self._toolbox.directory))
 
+    def set_thresholds(self, l_thresholds):
+
+        """ Set additional thresholds for which the branching ratios into
+        leptons, jets, photons and invisible particles are filled into the
+        columns br_leptons_thr, br_jets_thr, br_photons_thr and br_met_thr.
+        This has to be done before any point is added, unless the columns
+        exist already for the same number of thresholds (e.g. after
+        self.load()). """
+
+        l_schema = [('br_{}_thr'.format(particles), float,
+                     (len(l_thresholds), no_max)) for particles, no_max in
+                    [('leptons', 5), ('jets', 13), ('photons', 4),
+                     ('met', 5)]]
+        if l_thresholds and not all(
+                name in self._store.get_names() and
+                self._store.get_shape(name) == shape
+                for name, _, shape in l_schema):
+            self._store.add_columns(l_schema)
+
+        self.thresholds = list(l_thresholds)
+
+    def get_br_region(self, region):
+
+        """ Get branching ratio into a signal region for all points. region
+        is a function of (n_leptons, n_jets, n_photons, n_met), which returns
+        True for multiplicities in the signal region, e.g.
+            lambda n_l, n_j, n_y, n_met: n_l == 1 and n_j >= 4
+        The branching ratios are summed from the joint distributions, so no
+        recalculation is needed. The last entry of every axis of the joint
+        distributions holds all higher multiplicities (4 leptons, 12 jets,
+        3 photons, 4 invisible particles), so region must not tell these
+        apart, e.g. n_j >= 12 is fine, but n_j == 12 is not. """
+
+        shape = self._store.get_shape('br_joint')
+        mask = np.array([bool(region(*mult)) for mult in np.ndindex(*shape)],
+                        dtype=bool).reshape(shape)
+        return self._store.get_column('br_joint')[:, mask].sum(
+            axis=1).tolist()
+
     def _make_plot(self, name, title, coordinate_z, percentage=False,
                    decimals=1):
 
@@ -426,21 +512,119 @@ class MassScanPlots(object):
         #self._toolbox.plot_diagonal()
         self._toolbox.save(['pdf', 'png'])
 
+    def __getattr__(self, name):
+
+        """ Get column name of the results as attribute, with the points as
+        last axis, e.g. self.br_leptons[2] are the branching ratios into 2
+        leptons for all points. """
+
+        if name.startswith('_') or name not in self._store.get_names():
+            raise AttributeError(name)
+
+        return np.moveaxis(self._store.get_column(name), 0, -1)
+
+    def add_point(self, d_values):
+
+        """ Add results of one point, d_values is a dictionary of {column:
+        value}. Lists of branching ratios are cut or filled up with 0's to
+        the size of their columns. """
+
+        d_row = dict(
+            (name, self._get_fixed(value, self._store.get_shape(name)))
+            for name, value in d_values.iteritems())
+        if 'br_joint' in d_values:
+            d_row['br_joint'] = self._get_joint_fixed(
+                d_values['br_joint'], self._store.get_shape('br_joint'))
+
+        self._store.add_row(d_row)
+        self._derived.clear()
+
+    def _get_joint_fixed(self, dist, shape):
+
+        """ Cut or fill up joint distribution dist to shape, the
+        probabilities of the multiplicities which are cut are added to the
+        last entry of their axis. """
+
+        for axis, no_max in enumerate(shape):
+            if dist.shape[axis] > no_max:
+                dist = np.concatenate(
+                    [dist.take(range(no_max-1), axis=axis),
+                     dist.take(range(no_max-1, dist.shape[axis]),
+                               axis=axis).sum(axis=axis, keepdims=True)],
+                    axis=axis)
+
+        return self._get_fixed(dist, shape)
+
+    def _get_fixed(self, value, shape):
+
+        """ Cut or fill up (nested) list or array value to shape. """
+
+        if not shape:
+            return value
+
+        if isinstance(value, np.ndarray):
+            fixed = np.zeros(shape, dtype=value.dtype)
+            idxs = tuple(slice(0, min(no, no_value))
+                         for no, no_value in zip(shape, value.shape))
+            fixed[idxs] = value[idxs]
+            return fixed
+
+        default = [] if len(shape) > 1 else 0
+        return [self._get_fixed(get_lst_entry_default(value, idx, default),
+                                shape[1:]) for idx in range(shape[0])]
+
+    def get_dcs(self, name=None):
+
+        """ Get decay channels of all points, an array of [point, particle,
+        channel] (see DecayChannel.get_array()), or only those of particle
+        name (see self.l_dc_names). """
+
+        dcs = self._store.get_column('dc')
+        if name is not None:
+            return dcs[:, self.l_dc_names.index(name)]
+        return dcs
+
+    def save(self, filename):
+
+        """ Save results of all points to filename (.npz), together with the
+        additional thresholds (see self.set_thresholds()), so that they can
+        be plotted again later, see self.load(). """
+
+        self._store.save(filename, {'thresholds': self.thresholds})
+
+    def load(self, filename):
+
+        """ Load results of all points and the additional thresholds from
+        filename, see self.save(). Axis labels, text and star are not
+        stored. """
+
+        d_metadata = self._store.load(filename)
+        self._derived.clear()
+        self.thresholds = d_metadata.get('thresholds', np.zeros(0)).tolist()
+
     def _make_plot_dc(self, name, title, dcs):
 
-        """ Create plot showing relative decay channels. """
+        """ Create plot showing relative decay channels, dcs has the decay
+        channels for every point (see self.get_dcs()). """
 
         # If there's nothing to plot, don't plot it
         if len(dcs) == 0:
             return
 
+        # The toolbox takes one DecayChannel object per point
+        l_dcs = []
+        for channels in dcs:
+            dc_obj = DecayChannel()
+            dc_obj.fill_array(channels)
+            l_dcs.append(dc_obj)
+
         # The TH2 needs to have ten times as many bins per axis
         self._toolbox.create_histogram(name, title, self.coordinate_x,
                                        self.coordinate_y, 10)
         self._toolbox.modify_axes(self._axis_x, self._axis_y)
 
         # Fill numbers
-        self._toolbox.plot_dcs(self.coordinate_x, self.coordinate_y, dcs)
+        self._toolbox.plot_dcs(self.coordinate_x, self.coordinate_y, l_dcs)
         #self._toolbox.plot_diagonal()
         self._toolbox.save(['pdf', 'png'])
 
@@ -567,18 +751,23 @@ class MassScanPlots(object):
             system('mkdir -p {}'
                    .format('/'.join(s_rootfile_name.split('/')[:-1])))
 
+        from ROOT import TFile  # pylint: disable=import-error
+
+        self._load_toolbox()
         self._toolbox.rootfile = TFile(s_rootfile_name, 'UPDATE')
 
     def get_directory(self):
 
         """ Get directory in which objects are stored. """
 
+        self._load_toolbox()
         return self._toolbox.directory
 
     def set_directory(self, s_directory):
 
         """ Set directory in which objects are stored. """
 
+        self._load_toolbox()
         self._toolbox.directory = s_directory
 
     def set_star(self, coordinate_x, coordinate_y):
@@ -0,0 +1,94 @@
+#!/usr/bin/env python2
+
+""" Cache of the multiplicity distributions of decay subtrees. """
+
+from os import rename
+from os.path import isfile
+from collections import OrderedDict
+from cPickle import dump, load, HIGHEST_PROTOCOL
+from hashlib import sha1
+from Logger import LGR
+
+class MultiplicityCache(object):
+
+    """ Cache of the multiplicity distributions of decay subtrees. The
+    entries are keyed by a hash of the content of the subtree (the decay
+    modes of the particle and the hashes of its children) and the
+    thresholds, so they can be shared between points and, if the cache is
+    saved to filename, between scans. If there are more than max_entries
+    entries, the least recently used entries are removed. """
+
+    # Format of the distributions, files with another format are not used
+    version = 2
+
+    def __init__(self, filename=None, max_entries=100000):
+
+        """ Initialize object variables and load the cache from filename, if
+        it exists. """
+
+        self._filename = filename
+        self._max_entries = max_entries
+
+        # Dictionary of {key: value}, the least recently used entry first
+        self._d_entries = OrderedDict()
+
+        # Number of lookups and hits, for debug information
+        self._no_lookups = 0
+        self._no_hits = 0
+
+        if self._filename is not None and isfile(self._filename):
+            with open(self._filename, 'rb') as f_cache:
+                d_cache = load(f_cache)
+            if d_cache.get('version') != self.version:
+                LGR.info('Ignore decay subtrees in %s, which have an old '
+                         'format.', self._filename)
+                return
+            self._d_entries = d_cache['entries']
+            LGR.info('Loaded %d decay subtrees from %s.',
+                     len(self._d_entries), self._filename)
+
+    def get_hash(self, content):  # pylint: disable=no-self-use
+
+        """ Get hash of the content of a decay subtree, content has to have a
+        unique repr(). """
+
+        return sha1(repr(content)).hexdigest()
+
+    def get(self, key):
+
+        """ Return value for key, None if there is no such entry in the
+        cache. """
+
+        self._no_lookups += 1
+        value = self._d_entries.pop(key, None)
+        if value is not None:
+            # Mark entry as recently used
+            self._d_entries[key] = value
+            self._no_hits += 1
+        return value
+
+    def put(self, key, value):
+
+        """ Store value in the cache under key. """
+
+        self._d_entries[key] = value
+        while len(self._d_entries) > self._max_entries:
+            self._d_entries.popitem(last=False)
+
+    def save(self):
+
+        """ Save the cache to self._filename, if it is set. The file is
+        replaced in one step, so that it is never incomplete. """
+
+        LGR.debug('Multiplicity cache: %d of %d lookups found.',
+                  self._no_hits, self._no_lookups)
+
+        if self._filename is None:
+            return
+
+        with open('{}.tmp'.format(self._filename), 'wb') as f_cache:
+            dump({'version': self.version, 'entries': self._d_entries},
+                 f_cache, HIGHEST_PROTOCOL)
+        rename('{}.tmp'.format(self._filename), self._filename)
+        LGR.info('Saved %d decay subtrees to %s.', len(self._d_entries),
+                 self._filename)
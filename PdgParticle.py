@@ -2,8 +2,28 @@
 
 """ Class containing all PDG particle information. """
 
+import numpy as np
 from Logger import LGR
 
+def _make_table(l_categories):
+
+    """ Make classification table from l_categories, a list of (list of
+    particle IDs, category bit). Returns a dictionary of the categories
+    (bitmask) per particle ID, together with the sorted array of all
+    particle IDs and the array of their categories, for lookups of arrays of
+    particle IDs. """
+
+    d_categories = {}
+    for l_ids, category in l_categories:
+        for id_particle in l_ids:
+            d_categories[id_particle] = \
+                d_categories.get(id_particle, 0) | category
+
+    ids = np.array(sorted(d_categories), dtype=int)
+    categories = np.array([d_categories[id_particle] for id_particle in ids],
+                          dtype=int)
+    return d_categories, ids, categories
+
 class PdgParticle(object):
 
     """ Class containing all PDG particle information. """
@@ -44,50 +64,105 @@ class PdgParticle(object):
     _l_strong = [1000001, 1000002, 1000003, 1000004, 1000005, 1000006,
                  2000001, 2000002, 2000003, 2000004, 2000005, 2000006,
                  1000021]
+    # SM particles, for the categories of decay channels
+    _l_quarks = [1, 2, 3, 4, 5]
+    _l_top = [6]
+    _l_charged_leptons = [11, 13, 15]
+    _l_neutrinos = [12, 14, 16]
+
+    # Bits of the particle categories
+    _cat_final_state = 1 << 0
+    _cat_jet = 1 << 1
+    _cat_lepton = 1 << 2
+    _cat_met = 1 << 3
+    _cat_photon = 1 << 4
+    _cat_unknown = 1 << 5
+    _cat_strong = 1 << 6
+    _cat_quark = 1 << 7
+    _cat_top = 1 << 8
+    _cat_charged_lepton = 1 << 9
+    _cat_neutrino = 1 << 10
+
+    # Categories per particle ID (without sign), as dictionary and as
+    # arrays sorted by particle ID, see self._get_category() and
+    # self._get_categories()
+    _d_categories, _a_ids, _a_categories = _make_table(
+        [(_l_final_states, _cat_final_state),
+         (_l_jets, _cat_jet),
+         (_l_leptons, _cat_lepton),
+         (_l_met, _cat_met),
+         (_l_photon, _cat_photon),
+         (_l_unknown, _cat_unknown),
+         (_l_strong, _cat_strong),
+         (_l_quarks, _cat_quark),
+         (_l_top, _cat_top),
+         (_l_charged_leptons, _cat_charged_lepton),
+         (_l_neutrinos, _cat_neutrino)])
+
+    def _get_category(self, id_particle):
+
+        """ Return categories of id_particle as bitmask of the _cat_* bits,
+        0 if it isn't in any category. """
+
+        return self._d_categories.get(abs(id_particle), 0)
+
+    def _get_index(self, ids):
+
+        """ Return array of the indices of the particle IDs in the array ids
+        in self._a_ids, -1 for particle IDs which aren't in any category. """
+
+        ids = np.abs(np.asarray(ids, dtype=int))
+        idx = np.minimum(np.searchsorted(self._a_ids, ids),
+                         self._a_ids.size-1)
+        return np.where(self._a_ids[idx] == ids, idx, -1)
+
+    def _get_categories(self, ids):
+
+        """ Return array of the categories of the particle IDs in the array
+        ids, see self._get_category(). """
+
+        idx = self._get_index(ids)
+        return np.where(idx >= 0, self._a_categories[idx], 0)
 
     def _is_final_state(self, id_particle):
 
         """ Return if id_particle is considered a final state or not. """
 
-        return abs(id_particle) in self._l_final_states
+        return bool(self._get_category(id_particle) & self._cat_final_state)
 
     def _is_jet(self, id_particle):
 
         """ Return if id_particle is a final state jet or not. """
 
-        # All particles in this list need to be in the final state list as well
-        return abs(id_particle) in self._l_jets
+        return bool(self._get_category(id_particle) & self._cat_jet)
 
     def _is_lepton(self, id_particle):
 
         """ Return if id_particle is a charged final state lepton or not. """
 
-        # All particles in this list need to be in the final state list as well
-        return abs(id_particle) in self._l_leptons
+        return bool(self._get_category(id_particle) & self._cat_lepton)
 
     def _is_met(self, id_particle):
 
         """ Return if id_particle is undetectable and leads to missing
         transverse momentum. """
 
-        # All particles in this list need to be in the final state list as well
-        return abs(id_particle) in self._l_met
+        return bool(self._get_category(id_particle) & self._cat_met)
 
     def _is_photon(self, id_particle):
 
         """ Return if id_particle is final state photon or not. """
 
-        # All particles in this list need to be in the final state list as well
-        return abs(id_particle) in self._l_photon
+        return bool(self._get_category(id_particle) & self._cat_photon)
 
     def _is_unknown(self, id_particle):
 
         """ Return if id_particle has unknown decays. """
 
-        return abs(id_particle) in self._l_unknown
+        return bool(self._get_category(id_particle) & self._cat_unknown)
 
     def _is_strong(self, id_particle):
 
         """ Returns if SUSY particle is colored. """
 
-        return abs(id_particle) in self._l_strong
+        return bool(self._get_category(id_particle) & self._cat_strong)
@@ -0,0 +1,139 @@
+#!/usr/bin/env python2
+
+""" Pipeline which runs items through a sequence of stages. """
+
+import sys
+from threading import Thread, Lock
+from Queue import Queue
+from Logger import LGR
+
+# Marks the end of the items in a queue
+_STOP = object()
+
+class Pipeline(object):
+
+    """ Pipeline which runs items through a sequence of stages. Every stage
+    has its own threads and the stages are connected by bounded queues, so
+    that different stages work on different items at the same time. This is
+    useful if the stages mostly wait for external programs. """
+
+    def __init__(self, maxsize=1):
+
+        """ Initialize object variables. """
+
+        # Maximum number of items waiting between two stages
+        self._maxsize = maxsize
+
+        # List of [name, function, concurrency]
+        self._l_stages = []
+
+        # Exception (as returned by sys.exc_info()) raised in any stage
+        self._exc_info = None
+        self._lock = Lock()
+
+    def add_stage(self, name, function, concurrency=1):
+
+        """ Add stage at the end of the pipeline. function is called with the
+        item from the previous stage and returns the item for the next stage.
+        concurrency is the maximum number of items processed in this stage at
+        the same time. """
+
+        if concurrency < 1:
+            raise ValueError('Stage {} needs a concurrency of at least 1.'
+                             .format(name))
+
+        self._l_stages.append([name, function, concurrency])
+
+    def run(self, l_items):
+
+        """ Run all items in l_items through the pipeline and yield the
+        results of the last stage in the order in which they are done. If a
+        stage raises an exception, the remaining items are dropped and the
+        exception is raised again here. """
+
+        self._exc_info = None
+
+        l_queues = [Queue(self._maxsize) for _ in self._l_stages]
+        # The last queue is read by the caller, it doesn't need a limit
+        l_queues.append(Queue())
+
+        l_threads = [Thread(target=self._feed, args=(l_items, l_queues[0]))]
+        for idx, (name, function, concurrency) in enumerate(self._l_stages):
+            l_stage_threads = [Thread(target=self._work,
+                                      args=(name, function, l_queues[idx],
+                                            l_queues[idx+1]))
+                               for _ in range(concurrency)]
+            # Once all threads of a stage are done, stop the next stage
+            if idx+1 < len(self._l_stages):
+                no_next = self._l_stages[idx+1][2]
+            else:
+                no_next = 1
+            l_threads += l_stage_threads
+            l_threads.append(Thread(target=self._close,
+                                    args=(l_stage_threads, l_queues[idx+1],
+                                          no_next)))
+
+        for thread in l_threads:
+            thread.daemon = True
+            thread.start()
+
+        while True:
+            item = l_queues[-1].get()
+            if item is _STOP:
+                break
+            yield item
+
+        for thread in l_threads:
+            thread.join()
+
+        if self._exc_info is not None:
+            raise self._exc_info[0], self._exc_info[1], self._exc_info[2]
+
+    def _feed(self, l_items, queue):
+
+        """ Put all items into the queue of the first stage. """
+
+        for item in l_items:
+            if self._exc_info is not None:
+                break
+            queue.put(item)
+
+        for _ in range(self._l_stages[0][2]):
+            queue.put(_STOP)
+
+    def _work(self, name, function, queue_in, queue_out):
+
+        """ Process items from queue_in and put the results into queue_out,
+        until _STOP is found. """
+
+        while True:
+            item = queue_in.get()
+            if item is _STOP:
+                return
+
+            # After an error, only drain the queue
+            if self._exc_info is not None:
+                continue
+
+            try:
+                item = function(item)
+            except Exception:  # pylint: disable=broad-except
+                LGR.error('Error in pipeline stage %s.', name)
+                with self._lock:
+                    if self._exc_info is None:
+                        self._exc_info = sys.exc_info()
+                continue
+
+            queue_out.put(item)
+
+    def _close(self, l_threads, queue,  # pylint: disable=no-self-use
+               no_stops):
+
+        """ Wait for all threads in l_threads and put no_stops _STOP's into
+        queue. """
+
+        for thread in l_threads:
+            thread.join()
+
+        for _ in range(no_stops):
+            queue.put(_STOP)
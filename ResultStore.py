@@ -0,0 +1,149 @@
+#!/usr/bin/env python2
+
+""" Columnar store for the results of a scan. """
+
+from os import rename
+import numpy as np
+from Logger import LGR
+
+class ResultStore(object):
+
+    """ Columnar store for the results of a scan, one row per point. The
+    columns are declared in a schema, a list of (name, dtype, shape), where
+    shape is the shape of one entry, e.g. ('br_leptons', float, (5,)). The
+    rows are kept in a NumPy structured array, which grows by factors of 2.
+    Columns which are never filled (e.g. because they are not calculated)
+    are returned without any entries. """
+
+    def __init__(self, l_schema=None):
+
+        """ Initialize object variables. """
+
+        # List of (name, dtype, shape)
+        self._l_schema = []
+
+        # Rows, only the first self._no_rows are used
+        self._data = np.zeros(0, dtype=[])
+        self._no_rows = 0
+
+        # Names of the columns which have been filled
+        self._s_filled = set()
+
+        if l_schema is not None:
+            self.add_columns(l_schema)
+
+    def __len__(self):
+
+        """ Return number of rows. """
+
+        return self._no_rows
+
+    def add_columns(self, l_schema):
+
+        """ Add columns declared in l_schema (see ResultStore). This is only
+        possible as long as there are no rows. """
+
+        if self._no_rows:
+            raise RuntimeError('Columns can only be added to an empty store.')
+
+        for name, _, _ in l_schema:
+            if name in self.get_names():
+                raise ValueError('Column {} already exists.'.format(name))
+
+        self._l_schema += [(name, dtype, tuple(shape))
+                           for name, dtype, shape in l_schema]
+        self._data = np.zeros(0, dtype=self._get_dtype())
+
+    def _get_dtype(self):
+
+        """ Get dtype of the structured array of the rows. """
+
+        return np.dtype([(name, dtype, shape)
+                         for name, dtype, shape in self._l_schema])
+
+    def get_names(self):
+
+        """ Get names of all columns. """
+
+        return [name for name, _, _ in self._l_schema]
+
+    def get_shape(self, name):
+
+        """ Get shape of one entry of column name. """
+
+        for name_column, _, shape in self._l_schema:
+            if name_column == name:
+                return shape
+        raise KeyError(name)
+
+    def add_row(self, d_values):
+
+        """ Add one row with the values in the dictionary d_values of
+        {name: value}. Columns which are not in d_values are set to 0. """
+
+        if self._no_rows == len(self._data):
+            data = np.zeros(max(1, 2*len(self._data)), dtype=self._data.dtype)
+            data[:self._no_rows] = self._data
+            self._data = data
+
+        for name, value in d_values.iteritems():
+            self._data[name][self._no_rows] = value
+            self._s_filled.add(name)
+        self._no_rows += 1
+
+    def get_column(self, name):
+
+        """ Get array of the values of column name, with one entry per row
+        (no entries if the column has never been filled). """
+
+        column = self._data[name][:self._no_rows]
+        if name not in self._s_filled:
+            return column[:0]
+        return column
+
+    def save(self, filename, d_metadata=None):
+
+        """ Save store to filename (.npz), one array per column, and the
+        arrays in the dictionary d_metadata of {name: array}, which describe
+        the whole store. The file is replaced in one step, so that it is
+        never incomplete. """
+
+        d_arrays = dict((name, self._data[name][:self._no_rows])
+                        for name in self.get_names())
+        d_arrays['_filled'] = np.array(sorted(self._s_filled))
+        for name, array in (d_metadata or {}).iteritems():
+            d_arrays['_metadata_{}'.format(name)] = np.asarray(array)
+
+        with open('{}.tmp'.format(filename), 'wb') as f_store:
+            np.savez_compressed(f_store, **d_arrays)
+        rename('{}.tmp'.format(filename), filename)
+        LGR.info('Saved %d rows to %s.', self._no_rows, filename)
+
+    def load(self, filename):
+
+        """ Load store from filename (see self.save()). The schema is taken
+        from the file, all previous rows are dropped. Returns the dictionary
+        of metadata. """
+
+        with np.load(filename) as f_store:
+            l_names = [name for name in f_store.files
+                       if not name.startswith('_')]
+            d_arrays = dict((name, f_store[name]) for name in l_names)
+            s_filled = set(f_store['_filled'].tolist())
+            d_metadata = dict((name[len('_metadata_'):], f_store[name])
+                              for name in f_store.files
+                              if name.startswith('_metadata_'))
+
+        self._l_schema = []
+        self._no_rows = 0
+        self.add_columns([(name, d_arrays[name].dtype,
+                           d_arrays[name].shape[1:]) for name in l_names])
+        if l_names:
+            self._no_rows = len(d_arrays[l_names[0]])
+        self._data = np.zeros(self._no_rows, dtype=self._get_dtype())
+        for name in l_names:
+            self._data[name] = d_arrays[name]
+        self._s_filled = s_filled
+        LGR.info('Loaded %d rows from %s.', self._no_rows, filename)
+
+        return d_metadata
@@ -0,0 +1,200 @@
+#!/usr/bin/env python2
+
+""" Long-lived SModelS process, which loads the database of experimental
+    results only once and returns the highest r value for SLHA files. """
+
+import sys
+from os import devnull
+from os.path import abspath, join
+from ConfigParser import SafeConfigParser
+from select import select
+from subprocess import Popen, PIPE
+from Logger import LGR
+
+class SModelSService(object):
+
+    """ Client for the SModelS service. The service is started as a
+    subprocess (running this file), which reads paths to SLHA files from its
+    standard input and answers with one line per path:
+        RVALUE <highest r value>
+    or
+        ERROR <message>
+    The settings (sigmacut, minmassgap, maxcond, ...) are read from the
+    parameter file filename_parameters, which should be the same as the
+    one given to runSModelS (None: the default file of runSModelS). """
+
+    def __init__(self, dir_database='./smodels-database', timeout=1800,
+                 filename_parameters=None):
+
+        """ Initialize object variables. """
+
+        self._dir_database = dir_database
+        self._timeout = timeout
+        self._filename_parameters = filename_parameters
+        self._process = None
+        self._f_stderr = None
+
+    def _start(self):
+
+        """ Start the SModelS service. """
+
+        # If logging level is not set to debug, suppress output
+        if LGR.getEffectiveLevel() > 10:
+            self._f_stderr = open(devnull, 'w')
+
+        l_args = [sys.executable, abspath(__file__), self._dir_database]
+        if self._filename_parameters is not None:
+            l_args.append(abspath(self._filename_parameters))
+
+        LGR.info('Start SModelS service.')
+        self._process = Popen(l_args, stdin=PIPE, stdout=PIPE,
+                              stderr=self._f_stderr)
+
+    def stop(self):
+
+        """ Stop the SModelS service. """
+
+        if self._process is None:
+            return
+
+        if self._process.poll() is None:
+            self._process.kill()
+        self._process.wait()
+        self._process.stdin.close()
+        self._process.stdout.close()
+        self._process = None
+
+        if self._f_stderr is not None:
+            self._f_stderr.close()
+            self._f_stderr = None
+
+    def get_r(self, path_slha):
+
+        """ Return highest r value for SLHA file path_slha. If SModelS takes
+        longer than self._timeout, the service is restarted and 0 is
+        returned. Raises ValueError if SModelS fails for this file and
+        RuntimeError if the service is not working at all. """
+
+        if self._process is None or self._process.poll() is not None:
+            # Release the pipes and the handle of a service which has died
+            self.stop()
+            self._start()
+
+        try:
+            self._process.stdin.write('{}\n'.format(abspath(path_slha)))
+            self._process.stdin.flush()
+        except IOError:
+            self.stop()
+            raise RuntimeError('SModelS service is not running.')
+
+        if not select([self._process.stdout], [], [], self._timeout)[0]:
+            LGR.warning('SModelS service timed out for %s.', path_slha)
+            self.stop()
+            return 0.
+
+        line = self._process.stdout.readline()
+        if line.startswith('RVALUE'):
+            return float(line.split()[1])
+        if line.startswith('ERROR'):
+            raise ValueError(line.rstrip())
+
+        self.stop()
+        raise RuntimeError('SModelS service stopped unexpectedly.')
+
+
+def get_parameters(filename_parameters=None):
+
+    """ Read the settings of the decomposition and the theory predictions
+    from the SModelS parameter file filename_parameters in the same way as
+    runSModelS (None: the default file of runSModelS). Returns a dictionary
+    with the keys sigmacut [fb], minmassgap [GeV], maxcond, doCompress and
+    doInvisible. """
+
+    if filename_parameters is None:
+        # pylint: disable=import-error
+        from smodels.installation import installDirectory
+        filename_parameters = join(installDirectory(), 'etc',
+                                   'parameters_default.ini')
+
+    parser = SafeConfigParser()
+    if not parser.read(filename_parameters):
+        raise IOError('SModelS parameter file {} not found.'
+                      .format(filename_parameters))
+
+    return {'sigmacut': parser.getfloat('parameters', 'sigmacut'),
+            'minmassgap': parser.getfloat('parameters', 'minmassgap'),
+            'maxcond': parser.getfloat('parameters', 'maxcond'),
+            'doCompress': parser.getboolean('options', 'doCompress'),
+            'doInvisible': parser.getboolean('options', 'doInvisible')}
+
+
+def _get_r_max(path_slha, l_exp_results, d_parameters):
+
+    """ Decompose SLHA file path_slha and return the highest r value of all
+    theory predictions for the experimental results l_exp_results, with the
+    settings d_parameters (see get_parameters()). """
+
+    # pylint: disable=import-error
+    from smodels.theory import slhaDecomposer
+    from smodels.theory.theoryPrediction import theoryPredictionsFor
+    from smodels.tools.physicsUnits import fb, GeV
+
+    toplist = slhaDecomposer.decompose(
+        path_slha, sigcut=d_parameters['sigmacut']*fb,
+        doCompress=d_parameters['doCompress'],
+        doInvisible=d_parameters['doInvisible'],
+        minmassgap=d_parameters['minmassgap']*GeV)
+
+    r_max = 0.
+    for exp_result in l_exp_results:
+        predictions = theoryPredictionsFor(exp_result, toplist)
+        if not predictions:
+            continue
+        data_type = exp_result.getValuesFor('dataType')[0]
+        for prediction in predictions:
+            # Skip predictions which violate the conditions
+            max_cond = prediction.getmaxCondition()
+            if max_cond != 'N/A' and max_cond > d_parameters['maxcond']:
+                continue
+            if data_type == 'upperLimit':
+                upper_limit = exp_result.getUpperLimitFor(
+                    txname=prediction.txnames[0], mass=prediction.mass)
+            else:
+                upper_limit = exp_result.getUpperLimitFor(
+                    dataID=prediction.dataset.dataInfo.dataId)
+            if not upper_limit:
+                continue
+            r_value = (prediction.value[0].value/upper_limit).asNumber()
+            r_max = max(r_max, r_value)
+
+    return r_max
+
+
+def _serve(dir_database, filename_parameters=None):
+
+    """ Load the SModelS database and answer requests from stdin until stdin
+    is closed, with the settings from filename_parameters (see
+    get_parameters()). """
+
+    # SModelS might print to stdout, which is reserved for the answers
+    f_out = sys.stdout
+    sys.stdout = sys.stderr
+
+    # pylint: disable=import-error
+    from smodels.experiment.databaseObj import Database
+
+    d_parameters = get_parameters(filename_parameters)
+    l_exp_results = Database(dir_database).getExpResults()
+
+    for line in iter(sys.stdin.readline, ''):
+        try:
+            f_out.write('RVALUE {}\n'.format(_get_r_max(line.strip(),
+                                                        l_exp_results,
+                                                        d_parameters)))
+        except Exception as exc:  # pylint: disable=broad-except
+            f_out.write('ERROR {}\n'.format(str(exc).replace('\n', ' ')))
+        f_out.flush()
+
+
+if __name__ == "__main__":
+    _serve(*sys.argv[1:3])
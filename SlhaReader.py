@@ -0,0 +1,210 @@
+#!/usr/bin/env python2
+
+""" Reader for SLHA files, such as the SUSYHIT output file. """
+
+from mmap import mmap, ACCESS_READ
+from re import compile as re_compile, MULTILINE, IGNORECASE
+
+# Lines which start a BLOCK, DECAY table or XSECTION
+_HEADER = re_compile(r'^[ \t]*(BLOCK|DECAY|XSECTION)[ \t]+(.*)$',
+                     MULTILINE | IGNORECASE)
+
+class SlhaReader(object):
+
+    """ Reader for SLHA files, such as the SUSYHIT output file. The file is
+    memory-mapped and the byte offsets of all BLOCKs, DECAY tables and
+    XSECTIONs are indexed in one pass. A block is only split into lines when
+    it is accessed (by name or particle ID). The reader should be closed (or
+    used in a with statement) before the file is changed. """
+
+    def __init__(self, filename):
+
+        """ Initialize object variables and index file filename. """
+
+        self._filename = filename
+
+        # Content of the file (memory-mapped, a string if the file is empty)
+        self._data = ''
+        self._mmap = None
+
+        # Byte offsets (start, end) of the lines per BLOCK name
+        self._d_index_blocks = {}
+
+        # Widths and byte offsets (start, end) of the lines per particle ID,
+        # from DECAY tables
+        self._d_widths = {}
+        self._d_index_decays = {}
+
+        # Byte offsets of the cross sections, the format of each entry is
+        # [sqrt(s), (id_initial_1, id_initial_2), (id_final_1, ...),
+        #  (start, end)]
+        self._l_index_xsections = []
+
+        # Lines (split into words, without comments) per BLOCK name, filled
+        # when a block is accessed
+        self._d_blocks = {}
+
+        # Decays per particle ID, filled when a DECAY table is accessed
+        self._d_decays = {}
+
+        # Masses per particle ID, from BLOCK MASS
+        self._d_masses = None
+
+        # List of cross sections, see self.get_xsections()
+        self._l_xsections = None
+
+        self._index()
+
+    def __enter__(self):
+
+        """ Use reader in a with statement. """
+
+        return self
+
+    def __exit__(self, *args):
+
+        """ Close reader at the end of a with statement. """
+
+        self.close()
+
+    def close(self):
+
+        """ Unmap the file. The reader can't be used afterwards. """
+
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        self._data = ''
+
+    def _index(self):
+
+        """ Map file and index the headers of all blocks in one pass. """
+
+        with open(self._filename, 'rb') as f_slha:
+            # Empty files can't be mapped
+            f_slha.seek(0, 2)
+            if f_slha.tell() > 0:
+                self._mmap = mmap(f_slha.fileno(), 0, access=ACCESS_READ)
+                self._data = self._mmap
+
+        l_spans = None
+        for header in _HEADER.finditer(self._data):
+            # The previous block ends where this header starts
+            if l_spans is not None:
+                l_spans.append((start, header.start()))
+            start = header.end()
+
+            keyword = header.group(1).upper()
+            words = header.group(2).split('#', 1)[0].split()
+            if keyword == 'BLOCK':
+                l_spans = self._d_index_blocks.setdefault(words[0].upper(),
+                                                          [])
+            elif keyword == 'DECAY':
+                id_particle = int(words[0])
+                self._d_widths[id_particle] = float(words[1])
+                l_spans = self._d_index_decays.setdefault(id_particle, [])
+            else:
+                l_spans = []
+                no_final = int(words[3])
+                self._l_index_xsections.append(
+                    [float(words[0]),
+                     (int(words[1]), int(words[2])),
+                     tuple(int(x) for x in words[4:4+no_final]),
+                     l_spans])
+
+        if l_spans is not None:
+            l_spans.append((start, len(self._data)))
+
+    def _get_lines(self, l_spans):
+
+        """ Return lines (split into words, without comments and empty
+        lines) in the byte ranges l_spans. """
+
+        lines = []
+        for start, end in l_spans:
+            for line in self._data[start:end].splitlines():
+                words = line.split('#', 1)[0].split()
+                if words:
+                    lines.append(words)
+        return lines
+
+    def get_block(self, name):
+
+        """ Return lines (split into words) of block name. """
+
+        name = name.upper()
+        if name not in self._d_blocks:
+            self._d_blocks[name] = self._get_lines(
+                self._d_index_blocks.get(name, []))
+        return self._d_blocks[name]
+
+    def get_mass(self, id_particle):
+
+        """ Return mass of particle with ID id_particle, None if it is not
+        found. """
+
+        return self.get_masses().get(id_particle)
+
+    def get_masses(self):
+
+        """ Return dictionary of all masses per particle ID. """
+
+        if self._d_masses is None:
+            self._d_masses = {}
+            for words in self.get_block('MASS'):
+                self._d_masses[int(words[0])] = float(words[1])
+        return self._d_masses
+
+    def get_width(self, id_particle):
+
+        """ Return width of particle with ID id_particle, None if it has no
+        DECAY table. """
+
+        return self._d_widths.get(id_particle)
+
+    def get_decays(self, id_particle):
+
+        """ Return decays of particle with ID id_particle as list of
+        [branching ratio, [child1, child2, ...]]. The list is stored, so it
+        must not be changed. """
+
+        if id_particle in self._d_decays:
+            return self._d_decays[id_particle]
+
+        list_decays = []
+        for words in self._get_lines(self._d_index_decays.get(id_particle,
+                                                              [])):
+
+            # Format is [prob., # of childs, child1, child2, ...], so there
+            # need to be at least three entries
+            if len(words) < 3:
+                raise IndexError('Decay {} of particle {} needs to have at '
+                                 'least 3 elements. Something seems to be '
+                                 'wrong with the input.'
+                                 .format(words, id_particle))
+
+            # According to SLHA format, second number per line should be
+            # number of daughter particles
+            if int(words[1])+2 != len(words):
+                raise IndexError('According to SLHA format, second number '
+                                 'per line should be number of daugher '
+                                 'particles. Something seems to be wrong '
+                                 'with the input.')
+
+            list_decays.append([float(words[0]),
+                                [int(x) for x in words[2:]]])
+
+        self._d_decays[id_particle] = list_decays
+        return list_decays
+
+    def get_xsections(self):
+
+        """ Return list of all cross sections, the format of each entry is
+        [sqrt(s), (id_initial_1, id_initial_2), (id_final_1, ...), lines]. """
+
+        if self._l_xsections is None:
+            self._l_xsections = [[sqrts, initial, final,
+                                  self._get_lines(l_spans)]
+                                 for sqrts, initial, final, l_spans in
+                                 self._l_index_xsections]
+        return self._l_xsections
@@ -0,0 +1,84 @@
+#!/usr/bin/env python2
+
+""" Template for SLHA input files, such as the SUSYHIT input file. """
+
+from os import rename
+from re import match
+
+class SlhaTemplate(object):
+
+    """ Template for SLHA input files, such as the SUSYHIT input file. The
+    template file is read once and all lines of the form
+        <key> <value> [# comment]
+    are indexed by (BLOCK name, key). Input files are rendered in memory with
+    new values for some of these lines. """
+
+    def __init__(self, filename):
+
+        """ Initialize object variables and read template file filename. """
+
+        self._filename = filename
+
+        # Lines of the template file
+        self._l_lines = []
+
+        # Line numbers per (BLOCK name, key), together with the whitespace in
+        # front of the key
+        self._d_index = {}
+
+        self._read()
+
+    def _read(self):
+
+        """ Read template file and index lines per block and key. """
+
+        block = None
+        with open(self._filename, 'r') as f_template:
+            for idx, line in enumerate(f_template):
+                self._l_lines.append(line)
+
+                words = line.split('#', 1)[0].split()
+                if not words:
+                    continue
+
+                if words[0].upper() == 'BLOCK':
+                    block = words[1].upper()
+                    continue
+
+                line_match = match(r'(\s*)(\d+)\s', line)
+                if block is not None and line_match:
+                    self._d_index.setdefault(
+                        (block, int(line_match.group(2))), []).append(
+                            (idx, line_match.group(1)))
+
+    def render(self, d_values):
+
+        """ Return text of the template, with the values set in d_values,
+        which is a dictionary of {(BLOCK name, key): value}. The comments of
+        these lines are removed. """
+
+        l_lines = list(self._l_lines)
+        for (block, key), value in d_values.iteritems():
+            if (block.upper(), key) not in self._d_index:
+                raise RuntimeError('Key {} in block {} not found in {}.'
+                                   .format(key, block, self._filename))
+            for idx, indent in self._d_index[(block.upper(), key)]:
+                line = l_lines[idx]
+                l_lines[idx] = '{}{} {}{}'.format(indent, key, value,
+                                                 line[len(line.rstrip('\n')):])
+
+        return ''.join(l_lines)
+
+    def write(self, filename, d_values):
+
+        """ Write template with the values set in d_values to filename and
+        return the written text. The file is replaced in one step, so that
+        it is never incomplete. """
+
+        text = self.render(d_values)
+
+        with open('{}.tmp'.format(filename), 'w') as f_out:
+            f_out.write(text)
+        rename('{}.tmp'.format(filename), filename)
+
+        return text
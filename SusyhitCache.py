@@ -0,0 +1,99 @@
+#!/usr/bin/env python2
+
+""" On-disk cache of SUSYHIT output files. """
+
+from os import listdir, rename, utime, stat, makedirs
+from os.path import join, isdir
+from shutil import copyfile, rmtree
+from tempfile import mkdtemp
+from hashlib import sha1
+from Logger import LGR
+
+class SusyhitCache(object):
+
+    """ On-disk cache of SUSYHIT output files. The entries are keyed by a hash
+    of the SUSYHIT input file, the SUSYHIT version and the SUSYHIT option.
+    If the total size of the cache exceeds max_size (in bytes), the least
+    recently used entries are removed. """
+
+    # Files produced by SUSYHIT which are stored in the cache
+    _l_files = ['susyhit_slha.out', 'suspect2.out']
+
+    def __init__(self, directory, max_size=2**30):
+
+        """ Initialize object variables. """
+
+        self._directory = directory
+        self._max_size = max_size
+
+        if not isdir(self._directory):
+            makedirs(self._directory)
+
+    def get_key(self, text_in, version, option):  # pylint: disable=no-self-use
+
+        """ Get cache key for SUSYHIT input text_in, run with SUSYHIT version
+        and option. """
+
+        return sha1('{}\n{}\n{}'.format(version, option, text_in)).hexdigest()
+
+    def get(self, key, dir_susyhit):
+
+        """ Copy cached output files for key into dir_susyhit. Returns False
+        if there is no such entry in the cache. """
+
+        dir_entry = join(self._directory, key)
+        try:
+            for s_file in self._l_files:
+                copyfile(join(dir_entry, s_file), join(dir_susyhit, s_file))
+            # Mark entry as recently used
+            utime(dir_entry, None)
+        except (IOError, OSError):
+            return False
+
+        LGR.debug('Found SUSYHIT output %s in cache.', key)
+        return True
+
+    def put(self, key, dir_susyhit):
+
+        """ Store output files from dir_susyhit in the cache under key. """
+
+        # Copy to a temporary directory first and move it in place, so that
+        # other processes or threads never see incomplete entries
+        dir_entry = join(self._directory, key)
+        dir_tmp = mkdtemp(prefix='{}.tmp'.format(key), dir=self._directory)
+        try:
+            for s_file in self._l_files:
+                copyfile(join(dir_susyhit, s_file), join(dir_tmp, s_file))
+            rename(dir_tmp, dir_entry)
+        except (IOError, OSError):
+            # E.g. entry has been stored by another process in the meantime
+            rmtree(dir_tmp, ignore_errors=True)
+            return
+
+        LGR.debug('Stored SUSYHIT output %s in cache.', key)
+        self._evict()
+
+    def _evict(self):
+
+        """ Remove least recently used entries until the total size of the
+        cache is below self._max_size. """
+
+        l_entries = []
+        size_total = 0
+        for key in listdir(self._directory):
+            dir_entry = join(self._directory, key)
+            try:
+                size = sum(stat(join(dir_entry, s_file)).st_size
+                           for s_file in self._l_files)
+                l_entries.append((stat(dir_entry).st_mtime, size, dir_entry))
+            except OSError:
+                # Temporary directories or entries removed by other processes
+                continue
+            size_total += size
+
+        for _, size, dir_entry in sorted(l_entries):
+            if size_total <= self._max_size:
+                break
+            LGR.debug('Remove %s from SUSYHIT cache.', dir_entry)
+            rmtree(dir_entry, ignore_errors=True)
+            size_total -= size
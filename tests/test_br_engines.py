@@ -0,0 +1,144 @@
+#!/usr/bin/env python2
+
+""" Tests of the exact and the Monte Carlo calculation of the branching
+    ratios. Run from the main directory with
+        python -m unittest discover tests """
+
+import unittest
+import numpy as np
+from MassScan import MassScan
+
+
+class _Slha(object):
+
+    """ SUSYHIT output with the decay tables d_decays. """
+
+    def __init__(self, d_decays):
+
+        """ Initialize object variables. """
+
+        self._d_decays = d_decays
+
+    def get_decays(self, id_particle):
+
+        """ Return decays of id_particle, see SlhaReader. """
+
+        return self._d_decays.get(id_particle, [])
+
+
+class _Processes(object):
+
+    """ Production processes l_processes, see CrossSection. """
+
+    def __init__(self, l_processes):
+
+        """ Initialize object variables. """
+
+        self._l_processes = l_processes
+
+    def get_processes(self):
+
+        """ Return production processes (id_1, id_2, weight). """
+
+        return self._l_processes
+
+
+class TestBrEngines(unittest.TestCase):
+
+    """ Tests of the exact and the Monte Carlo calculation of the branching
+    ratios. """
+
+    @staticmethod
+    def _get_scan(engine, samples, l_processes):
+
+        """ Get scan with the branching ratios of a point with the
+        production processes l_processes, where the gluino (1000021) decays
+        via the neutralino2 (1000023) into the neutralino1 (1000022). """
+
+        # pylint: disable=protected-access
+        scan = MassScan()
+        scan._fill_dict_sm()
+        scan._slha = _Slha({1000021: [[.6, [1, -1, 1000022]],
+                                      [.4, [1000023, 21]]],
+                            1000023: [[.5, [1000022, 11, -11]],
+                                      [.3, [1000022, 23]],
+                                      [.2, [1000022, 999]]]})
+        scan._xs13 = _Processes(l_processes)
+        scan.set_threshold(0.)
+        scan.set_br_engine(engine, samples, 1)
+        scan._get_br_all()
+        return scan
+
+    def _get_br_joint(self, engine, samples=200000):
+
+        """ Get joint distribution for a point with gluino pair production
+        and the production of a gluino together with a particle without
+        decay modes (1000039), which is mapped to the unknown particle. """
+
+        # pylint: disable=protected-access
+        return self._get_scan(engine, samples,
+                              [(1000021, 1000021, .6),
+                               (1000021, 1000039, .4)])._br_joint
+
+    def test_engines_agree(self):
+
+        """ Both engines give the same joint distribution within the
+        statistical uncertainty of the Monte Carlo calculation, also for the
+        leg without decay modes. """
+
+        samples = 200000
+        br_exact = self._get_br_joint('exact')
+        br_mc = self._get_br_joint('mc', samples)
+
+        # The leg without decay modes counts as no particles, so the second
+        # process is not dropped
+        for br_joint in [br_exact, br_mc]:
+            self.assertGreater(br_joint.sum(), .6)
+        shape = np.maximum(br_exact.shape, br_mc.shape)
+        br_exact, br_mc = [np.pad(br_joint, zip([0]*4, shape-br_joint.shape),
+                                  'constant')
+                           for br_joint in [br_exact, br_mc]]
+        for mult in np.ndindex(*shape):
+            br_1 = br_exact[mult]
+            br_2 = br_mc[mult]
+            sigma = max(br_1*(1.-br_1)/samples, 1./samples**2)**.5
+            self.assertLess(abs(br_1-br_2), 5.*sigma,
+                            '{}: {} (exact), {} (mc)'.format(mult, br_1,
+                                                             br_2))
+
+    def test_convolve(self):
+
+        """ The convolution of two joint distributions is the distribution of
+        the sum of the multiplicities. """
+
+        rng = np.random.RandomState(1)
+        dist_1 = rng.random_sample((2, 3, 1, 2))*(rng.random_sample(
+            (2, 3, 1, 2)) < .5)
+        dist_2 = rng.random_sample((3, 1, 2, 2))
+        dist = np.zeros((4, 3, 2, 3))
+        for mult_1 in np.ndindex(*dist_1.shape):
+            for mult_2 in np.ndindex(*dist_2.shape):
+                dist[tuple(np.add(mult_1, mult_2))] += \
+                    dist_1[mult_1]*dist_2[mult_2]
+
+        # pylint: disable=protected-access
+        for dists in [(dist_1, dist_2), (dist_2, dist_1)]:
+            self.assertTrue(np.allclose(MassScan()._convolve(*dists), dist))
+        self.assertEqual(MassScan()._convolve(dist_1,
+                                              np.zeros((0, 0, 0, 0))).size, 0)
+
+    def test_no_processes(self):
+
+        """ Without production processes, both engines leave the
+        branching ratios empty, so the point is skipped. """
+
+        # pylint: disable=protected-access
+        for engine in ['exact', 'mc']:
+            scan = self._get_scan(engine, 1000, [])
+            for brs in [scan._br_leptons, scan._br_jets, scan._br_photons,
+                        scan._br_met]:
+                self.assertEqual(list(brs), [], engine)
+
+
+if __name__ == '__main__':
+    unittest.main()
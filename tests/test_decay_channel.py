@@ -0,0 +1,47 @@
+#!/usr/bin/env python2
+
+""" Tests of the decay channels as they are stored per point. Run from the
+    main directory with
+        python -m unittest discover tests """
+
+import unittest
+from DecayChannel import DecayChannel
+
+
+class TestDecayChannel(unittest.TestCase):
+
+    """ Tests of the decay channels as they are stored per point. """
+
+    def test_array(self):
+
+        """ The decay channels are kept one by one, also if they are in the
+        same category. """
+
+        dc_obj = DecayChannel()
+        for decay in [[.5, [1000022, 1, -1]], [.3, [1000022, 2, -2]],
+                      [.2, [1000024, 23]]]:
+            dc_obj.fill_dcs(decay)
+
+        dc_copy = DecayChannel()
+        dc_copy.fill_array(dc_obj.get_array())
+        self.assertEqual(dc_copy.get_susy(), [2, 2, 4])
+        self.assertEqual(dc_copy.get_sm(), [1, 1, 10])
+        self.assertEqual(dc_copy.get_br(), [.5, .3, .2])
+
+    def test_array_truncated(self):
+
+        """ If there are too many decay channels, the smallest ones are
+        dropped. """
+
+        dc_obj = DecayChannel()
+        no_channels = DecayChannel.no_channels_max+2
+        for idx in range(no_channels):
+            dc_obj.fill_dcs([(idx+1.)/no_channels**2, [1000022, 1, -1]])
+
+        dc_copy = DecayChannel()
+        dc_copy.fill_array(dc_obj.get_array())
+        self.assertEqual(dc_copy.get_br(), dc_obj.get_br()[2:])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python2
+
+""" Tests of storing the results of a scan. Run from the main directory
+    with
+        python -m unittest discover tests """
+
+import unittest
+from os import remove, close
+from tempfile import mkstemp
+import numpy as np
+from MassScanPlots import MassScanPlots
+
+
+class TestMassScanPlots(unittest.TestCase):
+
+    """ Tests of storing the results of a scan. """
+
+    @staticmethod
+    def _get_plots():
+
+        """ Get results of two points with additional thresholds and joint
+        distributions with more invisible particles than are stored. """
+
+        plots = MassScanPlots()
+        plots.set_thresholds([.05, .01])
+        for coordinate in [1., 2.]:
+            br_joint = np.zeros((2, 1, 1, 8))
+            br_joint[1, 0, 0, :] = .1*coordinate
+            br_joint[0, 0, 0, 0] = 1.-br_joint.sum()
+            plots.add_point({'coordinate_x': coordinate,
+                             'coordinate_y': coordinate,
+                             'br_joint': br_joint,
+                             'br_leptons_thr': [[.5, .5], [.4, .6]]})
+        return plots
+
+    def test_br_region(self):
+
+        """ Multiplicities which are not stored are counted in the last
+        entry of their axis. """
+
+        brs = self._get_plots().get_br_region(
+            lambda n_l, n_j, n_y, n_met: n_l == 1 and n_met >= 4)
+        self.assertTrue(np.allclose(brs, [.4, .8]))
+
+    def test_save_load(self):
+
+        """ The results and the additional thresholds are restored, which
+        can be set again. """
+
+        handle, filename = mkstemp(suffix='.npz')
+        close(handle)
+        try:
+            self._get_plots().save(filename)
+            plots = MassScanPlots()
+            plots.load(filename)
+        finally:
+            remove(filename)
+
+        self.assertEqual(plots.thresholds, [.05, .01])
+        self.assertTrue(np.allclose(plots.br_leptons_thr[1, 1], [.6, .6]))
+        self.assertTrue(np.allclose(plots.get_br_region(lambda *mult: True),
+                                    [1., 1.]))
+        plots.set_thresholds([.05, .01])
+        with self.assertRaises(RuntimeError):
+            plots.set_thresholds([.05, .01, .001])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python2
+
+""" Tests of the SModelS service against runSModelS. Run from the main
+    directory with
+        python -m unittest discover tests
+    The parity test needs SModelS, runSModelS and an SLHA file with cross
+    sections (SMODELS_TEST_SLHA, e.g. a susyhit_slha_nlo.out of a scan). """
+
+import unittest
+from os import environ, remove, close, system
+from distutils.spawn import find_executable
+from tempfile import mkstemp, mkdtemp
+from shutil import rmtree
+from SModelSService import SModelSService, get_parameters
+
+
+class TestSModelSService(unittest.TestCase):
+
+    """ Tests of the SModelS service. """
+
+    def test_get_parameters(self):
+
+        """ Settings are read from the sections of runSModelS. """
+
+        handle, filename = mkstemp(suffix='.ini')
+        close(handle)
+        with open(filename, 'w') as f_parameters:
+            f_parameters.write('[options]\n'
+                               'doCompress = False\n'
+                               'doInvisible = True\n'
+                               '[parameters]\n'
+                               'sigmacut = 0.5\n'
+                               'minmassgap = 10.\n'
+                               'maxcond = 0.1\n')
+        try:
+            self.assertEqual(get_parameters(filename),
+                             {'sigmacut': .5, 'minmassgap': 10.,
+                              'maxcond': .1, 'doCompress': False,
+                              'doInvisible': True})
+        finally:
+            remove(filename)
+
+    def test_get_parameters_missing(self):
+
+        """ A missing parameter file is an error, not the defaults. """
+
+        with self.assertRaises(IOError):
+            get_parameters('/nonexistent/parameters.ini')
+
+    @unittest.skipUnless(find_executable('runSModelS') and
+                         environ.get('SMODELS_TEST_SLHA'),
+                         'runSModelS or SMODELS_TEST_SLHA not available')
+    def test_parity_runsmodels(self):
+
+        """ The service gives the same r value as runSModelS. """
+
+        path_slha = environ['SMODELS_TEST_SLHA']
+        dir_database = environ.get('SMODELS_DATABASE', './smodels-database')
+        filename_parameters = environ.get('SMODELS_PARAMETERS')
+
+        dir_out = mkdtemp()
+        try:
+            cmd = 'runSModelS -o {}/summary.txt -f {}'.format(dir_out,
+                                                              path_slha)
+            if filename_parameters is not None:
+                cmd += ' -p {}'.format(filename_parameters)
+            self.assertEqual(system(cmd), 0)
+
+            r_runsmodels = 0.
+            with open('{}/summary.txt'.format(dir_out), 'r') as f_summary:
+                for line in f_summary:
+                    if line.startswith('The highest r value is'):
+                        r_runsmodels = float(line.rstrip().split()[-1])
+        finally:
+            rmtree(dir_out, ignore_errors=True)
+
+        service = SModelSService(dir_database,
+                                 filename_parameters=filename_parameters)
+        try:
+            self.assertAlmostEqual(service.get_r(path_slha), r_runsmodels,
+                                   places=6)
+        finally:
+            service.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()